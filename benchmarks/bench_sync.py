@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-License-Identifier: ISC
+
+# USAGE: $ python benchmarks/bench_sync.py [--sizes 10000,100000,1000000]
+#          [--workers N] [--baseline PATH] [--save-baseline] [--report PATH]
+# Times each stage of ⟦update.py⟧'s pipeline offline, on synthetic dumps (see
+# ⟦synthetic.py⟧) of increasing sizes: for each size, a first snapshot is
+# processed into a previous Toakao, then a revised snapshot is processed and
+# synchronized with it. The scaling exponent of each stage between two
+# consecutive sizes is reported (1 for linear, 2 for quadratic), and the
+# times are compared with those of the baseline, if any.
+
+import sys, os, json, math, argparse, contextlib
+
+_THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+_TOP_DIR = os.path.join(_THIS_DIR, "..")
+sys.path.insert(0, _TOP_DIR)
+sys.path.insert(0, _THIS_DIR)
+
+import update
+from profiling import StageProfiler
+from synthetic import synthetic_sources, revised_sources
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_BASELINE_PATH = os.path.join(_THIS_DIR, "baseline.json")
+# A stage regresses when it is slower than its baseline time by more than
+# this ratio, and by more than the noise floor (in seconds).
+DEFAULT_TOLERANCE = 0.25
+NOISE_FLOOR = 0.05
+
+def entrypoint(this_path, *args):
+  options = parsed_options(args)
+  results = dict()
+  for size in options.sizes:
+    print(f"Benchmarking {size} synthetic Toadua entries…")
+    profiler = benchmarked_pipeline(
+      size, options.seed, options.memory, options.workers)
+    profiler.print_summary()
+    results[str(size)] = profiler.report()["stages"]
+  print_scaling(results)
+  regressions = []
+  if os.path.isfile(options.baseline) and not options.save_baseline:
+    with open(options.baseline, "r", encoding = "utf-8") as f:
+      baseline = json.load(f)
+    regressions = regressions_from(results, baseline, options.tolerance)
+    print_regressions(regressions, options.baseline)
+  if options.report is not None:
+    save_results(results, options.report)
+  if options.save_baseline:
+    save_results(results, options.baseline)
+    print(f"Baseline saved as ⟦{options.baseline}⟧.")
+  if regressions != []:
+    sys.exit(1)
+
+def parsed_options(args):
+  parser = argparse.ArgumentParser(
+    prog = "bench_sync.py",
+    description = "Times the stages of update.py on synthetic dictionaries.")
+  parser.add_argument(
+    "--sizes", type = sizes_from_text, default = DEFAULT_SIZES,
+    help = "comma-separated numbers of Toadua entries (default: "
+      + ",".join(str(n) for n in DEFAULT_SIZES) + ")")
+  parser.add_argument("--seed", type = int, default = 0)
+  parser.add_argument(
+    "--memory", action = "store_true",
+    help = "also record the peak memory of each stage (slower)")
+  parser.add_argument(
+    "--workers", type = int, default = 1, metavar = "N",
+    help = "number of processes reformatting the entries (default: 1)")
+  parser.add_argument(
+    "--baseline", default = DEFAULT_BASELINE_PATH, metavar = "PATH",
+    help = "baseline times to compare with (default: benchmarks/baseline.json)")
+  parser.add_argument(
+    "--save-baseline", action = "store_true",
+    help = "save the times of this run as the baseline")
+  parser.add_argument(
+    "--tolerance", type = float, default = DEFAULT_TOLERANCE,
+    help = "slowdown ratio beyond which a stage counts as regressed")
+  parser.add_argument(
+    "--report", metavar = "PATH", help = "save the times of this run as JSON")
+  return parser.parse_args(args)
+
+def sizes_from_text(text):
+  return [int(s.replace("_", "")) for s in text.split(",") if s != ""]
+
+def benchmarked_pipeline(size, seed, trace_memory, workers = 1):
+  official, toadua, idmap_rows = synthetic_sources(size, seed)
+  revised_official, revised_toadua = revised_sources(official, toadua, seed + 1)
+  profiler = StageProfiler(enabled = True, trace_memory = trace_memory)
+  # The logs of the pipeline are of no interest here.
+  with open(os.devnull, "w", encoding = "utf-8") as devnull:
+    with contextlib.redirect_stdout(devnull):
+      idmap = update.idmap_from_rows(idmap_rows)
+      old_toakao = previous_toakao_from(
+        resolved_entries(official, toadua, idmap))
+      with profiler.stage("id-map load") as stage:
+        idmap = update.idmap_from_rows(idmap_rows)
+        stage["entries"] = len(idmap)
+      with profiler.stage("reformat") as stage:
+        revised_official, _ = update.reformat_official_dictionary(
+          revised_official, workers)
+        revised_toadua, _ = update.reformated_toadua(revised_toadua, workers)
+        new_toakao = revised_official + revised_toadua
+        stage["entries"] = len(new_toakao)
+      with profiler.stage("postprocess") as stage:
+        new_toakao, _ = update.postprocessed(new_toakao, idmap)
+        stage["entries"] = len(new_toakao)
+      with profiler.stage("competitor resolution") as stage:
+        new_toakao, _ = update.competitorless_of(new_toakao)
+        stage["entries"] = len(new_toakao)
+      with profiler.stage("sync") as stage:
+        old_toakao = update.sorted_toakao(old_toakao)
+        toakao, _, _ = update.sync_with(old_toakao, new_toakao)
+        stage["entries"] = len(toakao)
+      with profiler.stage("synonym computation") as stage:
+        sememe_index = update.sememe_index_of(toakao)
+        toakao = update.with_synonyms_from(toakao, sememe_index)
+        stage["entries"] = len(sememe_index)
+  return profiler
+
+def resolved_entries(official, toadua, idmap):
+  official, _ = update.reformat_official_dictionary(official)
+  toadua, _ = update.reformated_toadua(toadua)
+  entries, _ = update.postprocessed(official + toadua, idmap)
+  entries, _ = update.competitorless_of(entries)
+  return entries
+
+def previous_toakao_from(entries):
+  # A Toakao such as a previous run could have produced from the given
+  # entries: each entry gets a discriminator, and the translations of a same
+  # sense are merged into a single entry.
+  by_key = dict()
+  for e in entries:
+    key = (e["lemma"], e["discriminator"] or "1")
+    e["discriminator"] = key[1]
+    if key in by_key:
+      merged = by_key[key]
+      merged["langdata"].update(e["langdata"])
+      for k, v in e.items():
+        if k.endswith(("_definition", "_notes", "_gloss")):
+          merged[k] = v
+    else:
+      by_key[key] = e
+  return list(by_key.values())
+
+# ==================================================================== #
+
+def stage_times_of(stages):
+  return {r["name"]: r["wall_time"] for r in stages}
+
+def print_scaling(results):
+  sizes = sorted(results, key = int)
+  times = {size: stage_times_of(results[size]) for size in sizes}
+  print("Wall times (s) and scaling exponents between consecutive sizes:")
+  print("  " + "stage".ljust(24) + "".join(size.rjust(12) for size in sizes))
+  for name in times[sizes[0]]:
+    line = "  " + name.ljust(24)
+    for i, size in enumerate(sizes):
+      line += f"{times[size][name]:12.3f}"
+    exponents = []
+    for a, b in zip(sizes, sizes[1:]):
+      ta, tb = times[a][name], times[b][name]
+      if ta > 0 and tb > 0:
+        exponents.append(
+          f"{math.log(tb / ta) / math.log(int(b) / int(a)):.2f}")
+      else:
+        exponents.append("?")
+    if exponents != []:
+      line += "   n^" + " → n^".join(exponents)
+    print(line)
+
+def regressions_from(results, baseline, tolerance):
+  regressions = []
+  for size, stages in results.items():
+    if size not in baseline:
+      continue
+    reference = stage_times_of(baseline[size])
+    for name, t in stage_times_of(stages).items():
+      t0 = reference.get(name)
+      if t0 is None:
+        continue
+      if t > t0 * (1 + tolerance) and t - t0 > NOISE_FLOOR:
+        regressions.append((size, name, t0, t))
+  return regressions
+
+def print_regressions(regressions, baseline_path):
+  if regressions == []:
+    print(f"No regression with respect to ⟦{baseline_path}⟧.")
+    return
+  print(f"Regressions with respect to ⟦{baseline_path}⟧:")
+  for size, name, t0, t in regressions:
+    print(f"  {size} entries, {name}: {t0:.3f} s → {t:.3f} s ({t / t0:.2f}×)")
+
+def save_results(results, path):
+  with open(path, "w", encoding = "utf-8") as f:
+    json.dump(results, f, indent = 2, ensure_ascii = False)
+
+
+# === ENTRY POINT === #
+
+if __name__ == "__main__":
+  entrypoint(*sys.argv)
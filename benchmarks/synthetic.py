@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-License-Identifier: ISC
+
+# Generator of synthetic dumps shaped like those ⟦update.py⟧ downloads: the
+# official dictionary, the results of a Toadua search, and the rows of
+# ⟦id-map.csv⟧. The same seed always yields the same dumps.
+# The dumps feature polysemes (several Toadua entries per headword),
+# definitions in several languages, competing translations of a same sense,
+# ⟪field: value⟫ notes, archived scopes and entries by the official accounts.
+
+import random, copy
+
+INITIALS = [
+  "", "b", "c", "ch", "d", "f", "g", "h", "j", "k", "l", "m", "n", "nh", "p",
+  "r", "s", "sh", "t", "z", "ꝡ", "'"]
+VOWELS = ["a", "e", "ı", "o", "u", "ao", "aı", "oe", "ıa", "ua"]
+TONED = {"a": "á", "e": "é", "ı": "í", "o": "ó", "u": "ú"}
+SCOPES = ["en", "en", "en", "toa", "es", "fr", "ja", "eo", "pl"]
+USERS = [
+  "ntsekees", "uakci", "solpahi", "countries", "evie", "official",
+  "oldofficial", "examples"]
+NOTE_FIELDS = [
+  "type", "frame", "distribution", "pronominal_class", "subject", "etymology",
+  "officialized", "examples", "sememe"]
+BODY_TEMPLATES = [
+  "▯ means {lemma} {n}", "= formal {lemma}", "⚙ meta", "≈ approx",
+  "predicate: ‘gl{n}’; ▯ does {lemma}"]
+
+def synthetic_word(rng):
+  w = ""
+  for i in range(rng.choice([1, 1, 2, 2, 3])):
+    w += rng.choice(INITIALS) if i == 0 else rng.choice(INITIALS[1:])
+    w += rng.choice(VOWELS)
+    if rng.random() < 0.2:
+      w += rng.choice("mq")
+  if rng.random() < 0.05:
+    w = w.capitalize()
+  if rng.random() < 0.05:
+    w += " " + w
+  if rng.random() < 0.08:
+    w = "".join(TONED.get(c, c) for c in w)
+  return w
+
+def synthetic_date(rng):
+  return "20%02d-%02d-%02dT%02d:%02d:%02d.%03dZ" % (
+    rng.randint(18, 26), rng.randint(1, 12), rng.randint(1, 28),
+    rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59),
+    rng.randint(0, 999))
+
+def synthetic_notes(rng, sememe_count):
+  notes = []
+  for _ in range(rng.choice([0, 0, 1, 2, 4])):
+    field = rng.choice(NOTE_FIELDS + ["comment"])
+    if field == "officialized":
+      value = rng.choice(["True", "no"])
+    elif field == "sememe":
+      value = "P%d" % rng.randint(0, sememe_count)
+    else:
+      value = "v%d" % rng.randint(0, 9)
+    name = rng.choice([field, field.capitalize(), field + "s"])
+    notes.append({
+      "date": synthetic_date(rng), "user": rng.choice(USERS),
+      "content": f"{name}: {value}"})
+  return notes
+
+def synthetic_sources(size, seed = 0):
+  # Returns ⟦(official, toadua, idmap_rows)⟧, with about ⟦size⟧ Toadua
+  # entries in total.
+  rng = random.Random(seed)
+  headword_count = max(1, size * 10 // 23)
+  lemmas = sorted(set(synthetic_word(rng) for _ in range(headword_count)))
+  official = []
+  toadua = []
+  idmap_rows = []
+  n = 0
+  for lemma in lemmas:
+    if rng.random() < 0.15:
+      official.append({
+        "toaq": lemma,
+        "type": rng.choice(["predicate", "pronoun", ""]),
+        "english": f"▯ is {lemma}-ish ◌",
+        "gloss": lemma[:3],
+        "frame": rng.choice(["c", "c c", ""]),
+        "distribution": "d",
+        "pronominal_class": "ho",
+        "subject": "free",
+        "notes": ["a", "b"] if rng.random() < 0.3 else [],
+        "examples":
+          [{"toaq": "X " + lemma, "english": "y"}]
+          if rng.random() < 0.2 else []
+      })
+    for _ in range(rng.choice([1, 1, 1, 2, 3, 5])):
+      if len(toadua) >= size:
+        break
+      n += 1
+      id = "id%07d" % n
+      scope = rng.choice(SCOPES)
+      if rng.random() < 0.03:
+        scope += rng.choice(["-arch", "-archive"])
+      toadua.append({
+        "id": id,
+        "date": synthetic_date(rng),
+        "head": lemma,
+        "body": rng.choice(BODY_TEMPLATES).format(lemma = lemma, n = n),
+        "user": rng.choice(USERS),
+        "scope": scope,
+        "notes": synthetic_notes(rng, size // 5),
+        "score": rng.choice([-1, 0, 0, 1, 2, 3]),
+        "votes": {}
+      })
+      if rng.random() < 0.6:
+        idmap_rows.append(
+          [id, "eng", lemma, rng.choice(["1", "1", "1", "2", "3"])])
+  return official, toadua, idmap_rows
+
+def revised_sources(official, toadua, seed = 1):
+  # A later snapshot of the given dumps: some definitions are edited,
+  # rescored, annotated or deleted, and about 10 % of new entries appear.
+  rng = random.Random(seed)
+  official = copy.deepcopy(official)
+  toadua = copy.deepcopy(toadua)
+  for e in toadua:
+    r = rng.random()
+    if r < 0.05:
+      e["body"] += " (edited)"
+    elif r < 0.08:
+      e["score"] += 1
+    elif r < 0.10:
+      e["notes"].append({
+        "date": synthetic_date(rng), "user": "examples",
+        "content": "type: changed"})
+  toadua = [e for e in toadua if rng.random() > 0.03]
+  _, additions, _ = synthetic_sources(max(10, len(toadua) // 10), seed + 100)
+  for e in additions:
+    e["id"] = "x" + e["id"]
+  toadua += additions
+  for e in official:
+    if rng.random() < 0.05:
+      e["english"] += " (rev)"
+  return official, toadua
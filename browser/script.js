@@ -2,6 +2,14 @@
 var g_lexicon = [];
 //var g_selection = "All";
 
+// When ⟦../shards/manifest.json⟧ is available, the lexicon is loaded shard by
+// shard (see ⟦utils/make-shards.py⟧), only when a query needs them; otherwise
+// ⟦g_lexicon⟧ holds the whole of ⟦toakao_extended.json⟧.
+const SHARDS_URL = "../shards/";
+var g_manifest = null;
+var g_shard_promises = {};
+var g_run_id = 0;
+
 function is_string(v) {
     return Object.prototype.toString.call(v) === '[object String]';
 }
@@ -154,21 +162,88 @@ function html_entry_for(entry, field_selection) {
 	return "<details class='entry'>\n" + ehtml + "\n</details>\n";
 }
 
-function run() {
+function shard_key_of(lemma) {
+	// Same as ⟦shard_key_of⟧ in ⟦utils/make-shards.py⟧.
+	var s = lemma.normalize("NFD").replace(/[\u0300-\u036f]/g, "").toLowerCase();
+	if (s === "") return "_";
+	var c = String.fromCodePoint(s.codePointAt(0)).replace("i", "ı");
+	if (c >= "a" && c <= "z") return c;
+	return "u" + c.codePointAt(0).toString(16).padStart(4, "0");
+}
+
+function shard_keys_for(filter) {
+	// A filter of the form ⟪@lemma ^x…⟫ (without any general search term)
+	// only needs the shard of the initial ⟪x⟫; any other filter needs all of
+	// them.
+	var all_keys = Object.keys(g_manifest["shards"]);
+	var pf = parsed_filter(filter);
+	if (pf["lemma|eng_definition"] !== "" || !("lemma" in pf))
+		return all_keys;
+	var source = pf["lemma"].source;
+	var m = source.match(/^\^([^\\\[\]\(\)\.\|\?\*\+\{\}\^\$])(?![?*{])/u);
+	if (m === null || source.includes("|"))
+		return all_keys;
+	var key = shard_key_of(m[1]);
+	return all_keys.includes(key) ? [key] : [];
+}
+
+function loaded_shard(key) {
+	// The shards are fetched at most once per session; their URL includes
+	// their digest, so that the browser cache can keep them until they change.
+	if (!(key in g_shard_promises)) {
+		var shard = g_manifest["shards"][key];
+		g_shard_promises[key] = fetch(
+			SHARDS_URL + shard["path"] + "?h=" + shard["sha256"],
+			{cache: "force-cache"})
+			.then((response) => response.json());
+	}
+	return g_shard_promises[key];
+}
+
+function html_entries_for(entries, filter, field_selection) {
+	var html = "";
+	var count = 0;
+	for (const entry of entries) {
+		if (!validated_by_filter(entry, filter)) continue;
+		count += 1;
+		html += html_entry_for(entry, field_selection);
+	}
+	return [html, count];
+}
+
+function show_results(html, count, is_complete) {
+	document.getElementById("result-count").innerHTML =
+		"(" + count + " results" + (is_complete ? "" : "…") + ")";
+	document.getElementById("results").innerHTML =
+		html + "<div class='entry'></div>\n";
+}
+
+async function run() {
+	var run_id = ++g_run_id;
 	var field_selection = document.getElementById("fields-selector").value;
 	var filter = document.getElementById("filter-text").value;
 	var html = "";
 	var count = 0;
 	if (filter !== "") {
-		for (const entry of g_lexicon) {
-			if (filter != "" && !validated_by_filter(entry, filter)) continue;
-			count += 1;
-			html += html_entry_for(entry, field_selection);
+		if (g_manifest === null) {
+			[html, count] = html_entries_for(g_lexicon, filter, field_selection);
+		} else {
+			// The shards are requested all at once, and their results shown in
+			// order as soon as they arrive.
+			var keys = shard_keys_for(filter);
+			var shards = keys.map(loaded_shard);
+			for (const shard of shards) {
+				var entries = await shard;
+				if (run_id !== g_run_id) return; // A newer run took over.
+				var [shard_html, shard_count] =
+					html_entries_for(entries, filter, field_selection);
+				html += shard_html;
+				count += shard_count;
+				show_results(html, count, false);
+			}
 		}
 	}
-	html += "<div class='entry'></div>\n";
-	document.getElementById("result-count").innerHTML = "(" + count + " results)";
-	document.getElementById("results").innerHTML = html;
+	show_results(html, count, true);
 }
 
 function get_url_parameters() {
@@ -207,9 +282,21 @@ function setup_2(lexicon) {
 }
 
 function setup() {
-	fetch('../toakao_extended.json')
-    .then((response) => response.text())
-    .then((json) => {setup_2(JSON.parse(json))});
+	fetch(SHARDS_URL + "manifest.json", {cache: "no-cache"})
+		.then((response) => {
+			if (!response.ok) throw new Error(response.statusText);
+			return response.json();
+		})
+		.then((manifest) => {
+			g_manifest = manifest;
+			setup_2([]);
+		})
+		.catch((error) => {
+			// Without shards, the whole lexicon is loaded at once.
+			fetch('../toakao_extended.json')
+				.then((response) => response.text())
+				.then((json) => {setup_2(JSON.parse(json))});
+		});
 }
 
 setup();
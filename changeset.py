@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-License-Identifier: ISC
+
+# Changesets of ⟦update.py⟧: what a synchronization would change in the
+# output files, computed without writing them (⟪--dry-run⟫, ⟪--check⟫), and
+# applied later without recomputing anything (⟪--apply⟫).
+# The changes to ⟦toakao.json⟧ are given entry by entry, as the entries to
+# insert or replace (⟪upserts⟫) and the entries to remove (⟪removals⟫), both
+# keyed by ⟪lemma#discriminator⟫; the other output files are given in full,
+# but only when their content changes. The per-field changes of the
+# synchronization are included for review.
+# Each file is given along with the SHA-256 digest of its expected content,
+# and the changeset records the digest of the ⟦toakao.json⟧ it was computed
+# from, so that it is only applied to that very file.
+
+import os, time
+import json_backend
+from digests import sha256_of_bytes, sha256_of_file
+
+CHANGESET_VERSION = 1
+TOAKAO_FILENAME = "toakao.json"
+
+def key_of(entry):
+  return f"{entry['lemma']}#{entry['discriminator']}"
+
+def _as_dict(entry):
+  return entry.to_dict() if hasattr(entry, "to_dict") else entry
+
+def _digest_of_path(path):
+  return sha256_of_file(path) if os.path.isfile(path) else None
+
+def changeset_from(outputs, field_changes):
+  # ⟦outputs⟧ maps the path of each output file to its new content, the
+  # first one being ⟦toakao.json⟧; ⟦field_changes⟧ is the changeset of the
+  # synchronization log (see ⟦sync_log.py⟧).
+  paths = list(outputs)
+  toakao_path = paths[0]
+  assert os.path.basename(toakao_path) == TOAKAO_FILENAME
+  base = json_backend.load_path(toakao_path) if os.path.isfile(
+    toakao_path) else []
+  toakao = [_as_dict(e) for e in outputs[toakao_path]]
+  content = json_backend.dumps(toakao)
+  changeset = {
+    "version": CHANGESET_VERSION,
+    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    "base_sha256": _digest_of_path(toakao_path),
+    TOAKAO_FILENAME: toakao_changes_of(base, toakao),
+    "outputs": dict(),
+    "field_changes": field_changes
+  }
+  changeset[TOAKAO_FILENAME]["sha256"] = sha256_of_bytes(content)
+  for path in paths[1:]:
+    content = json_backend.dumps(outputs[path])
+    digest = sha256_of_bytes(content)
+    if digest != _digest_of_path(path):
+      changeset["outputs"][os.path.basename(path)] = {
+        "sha256": digest,
+        "content": outputs[path]
+      }
+  return changeset
+
+def toakao_changes_of(base, toakao):
+  # Should a key occur more than once, the entries could not be told apart
+  # by key, so the whole new content is given instead.
+  base_index = {key_of(e): e for e in base}
+  index = {key_of(e): e for e in toakao}
+  if len(base_index) != len(base) or len(index) != len(toakao):
+    return {"content": toakao} if base != toakao else dict()
+  upserts = dict()
+  for k, e in index.items():
+    b = base_index.get(k)
+    # Key order matters, as it is kept in the file.
+    if b is None or list(b.items()) != list(e.items()):
+      upserts[k] = e
+  changes = dict()
+  if upserts != dict():
+    changes["upserts"] = upserts
+  removals = [k for k in base_index if k not in index]
+  if removals != []:
+    changes["removals"] = removals
+  return changes
+
+def is_empty(changeset):
+  toakao_changes = changeset[TOAKAO_FILENAME]
+  return (
+    changeset["outputs"] == dict()
+    and not any(k in toakao_changes for k in ("upserts", "removals", "content")))
+
+def summary_of(changeset):
+  toakao_changes = changeset[TOAKAO_FILENAME]
+  lines = []
+  if "content" in toakao_changes:
+    lines.append(f"{TOAKAO_FILENAME}: rewritten in full.")
+  else:
+    lines.append(
+      f"{TOAKAO_FILENAME}: {len(toakao_changes.get('upserts', dict()))} "
+      + f"entries added or changed, {len(toakao_changes.get('removals', []))} "
+      + "removed.")
+  for name in changeset["outputs"]:
+    lines.append(f"{name}: changed.")
+  return lines
+
+def applied_outputs(changeset, this_dir, sorted_toakao):
+  # The new content of each changed output file, by path, after checking
+  # that the changeset applies to the current ⟦toakao.json⟧ and that the
+  # result has the expected digests; ⟦sorted_toakao⟧ restores the order of
+  # the entries.
+  if changeset.get("version") != CHANGESET_VERSION:
+    raise ValueError("Unsupported changeset version.")
+  toakao_path = os.path.join(this_dir, TOAKAO_FILENAME)
+  if _digest_of_path(toakao_path) != changeset["base_sha256"]:
+    raise ValueError(
+      f"The changeset was not computed from the current {TOAKAO_FILENAME}.")
+  outputs = dict()
+  toakao_changes = changeset[TOAKAO_FILENAME]
+  if "content" in toakao_changes:
+    toakao = toakao_changes["content"]
+  else:
+    base = json_backend.load_path(toakao_path) if os.path.isfile(
+      toakao_path) else []
+    upserts = toakao_changes.get("upserts", dict())
+    removals = set(toakao_changes.get("removals", []))
+    toakao = [
+      upserts.get(key_of(e), e) for e in base if key_of(e) not in removals]
+    base_keys = {key_of(e) for e in base}
+    toakao += [e for k, e in upserts.items() if k not in base_keys]
+    toakao = sorted_toakao(toakao)
+  outputs[toakao_path] = toakao
+  for name, output in changeset["outputs"].items():
+    outputs[os.path.join(this_dir, name)] = output["content"]
+  expected = {toakao_path: changeset[TOAKAO_FILENAME]["sha256"]}
+  for name, output in changeset["outputs"].items():
+    expected[os.path.join(this_dir, name)] = output["sha256"]
+  for path, content in outputs.items():
+    if sha256_of_bytes(json_backend.dumps(content)) != expected[path]:
+      raise ValueError(
+        f"Applying the changeset does not give the expected "
+        + f"{os.path.basename(path)}.")
+  return outputs
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-License-Identifier: ISC
+
+# Checkpoints of the runs of ⟦update.py⟧, from which a run can be replayed
+# offline (⟪--replay⟫).
+# Each run saves its checkpoints into a directory of its own, named after
+# its start time, under ⟦.cache/checkpoints/⟧:
+#   ⟪raw⟫            the downloaded official dictionary and Toadua entries,
+#                    and copies of ⟦toakao.json⟧ and ⟦id-map.csv⟧;
+#   ⟪reformatted⟫    the unified entries, before postprocessing, and the
+#                    examples (⟦muakao.json⟧);
+#   ⟪postprocessed⟫  the postprocessed entries, and the nonlemmas;
+#   ⟪resolved⟫       the entries without competitors, and the discarded ones.
+# ⟦checkpoints.json⟧ lists the stages which were completely saved, along with
+# the version of their format; only those can be replayed.
+
+import os, time, shutil, tempfile
+import json_backend
+
+CHECKPOINT_VERSION = 1
+STAGES = ("raw", "reformatted", "postprocessed", "resolved")
+RUNS_KEPT = 3
+INDEX_FILENAME = "checkpoints.json"
+
+class CheckpointRun:
+  def __init__(self, directory):
+    self.directory = directory
+    self.run_id = os.path.basename(directory)
+    try:
+      self.index = json_backend.load_path(self.path_of(INDEX_FILENAME))
+    except (OSError, ValueError):
+      self.index = {"version": CHECKPOINT_VERSION, "stages": dict()}
+
+  @staticmethod
+  def new(root):
+    # A new run, the oldest ones being removed beyond ⟦RUNS_KEPT⟧.
+    run_id = time.strftime("%Y%m%dT%H%M%S")
+    directory = os.path.join(root, run_id)
+    n = 1
+    while os.path.exists(directory):
+      n += 1
+      directory = os.path.join(root, f"{run_id}-{n}")
+    os.makedirs(directory)
+    for old_run_id in sorted(os.listdir(root))[: -RUNS_KEPT]:
+      shutil.rmtree(os.path.join(root, old_run_id), ignore_errors = True)
+    return CheckpointRun(directory)
+
+  @staticmethod
+  def replayable(root, stage, run_id = None):
+    # The given run, or else the most recent one, if it has a checkpoint of
+    # ⟦stage⟧ and those of the previous stages.
+    if not os.path.isdir(root):
+      run_ids = []
+    elif run_id is not None:
+      run_ids = [run_id]
+    else:
+      run_ids = sorted(os.listdir(root), reverse = True)
+    for run_id in run_ids:
+      run = CheckpointRun(os.path.join(root, run_id))
+      if run.has_completed(stage):
+        return run
+    raise LookupError(f"No checkpoint of the stage ⟪{stage}⟫ to replay.")
+
+  def path_of(self, filename):
+    return os.path.join(self.directory, filename)
+
+  def has_completed(self, stage):
+    # Later stages depend on the data of the earlier ones.
+    return (
+      self.index.get("version") == CHECKPOINT_VERSION
+      and all(
+        s in self.index["stages"]
+        for s in STAGES[: STAGES.index(stage) + 1]))
+
+  def complete(self, stage, filenames):
+    self.index["stages"][stage] = {
+      "files": filenames,
+      "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
+    self._write(INDEX_FILENAME, json_backend.dumps(self.index))
+
+  # ⌵ Saving.
+
+  def save(self, stage, objects_by_filename):
+    # Saves the checkpoint of a whole stage at once.
+    for filename, obj in objects_by_filename.items():
+      self.save_file(filename, obj)
+    self.complete(stage, list(objects_by_filename))
+
+  def save_file(self, filename, obj):
+    self._write(filename, json_backend.dumps(obj, indent = None))
+
+  def copy_file(self, filename, path):
+    shutil.copyfile(path, self.path_of(filename))
+
+  def recorded(self, filename, elements):
+    # Passes the elements of the iterator through, while saving them as a
+    # JSON array (before they are modified by their consumer); the file
+    # only appears once the iterator is exhausted.
+    fd, tmp_path = tempfile.mkstemp(dir = self.directory, prefix = ".tmp-")
+    try:
+      with os.fdopen(fd, "wb") as f:
+        f.write(b"[")
+        for i, e in enumerate(elements):
+          if i > 0:
+            f.write(b", ")
+          f.write(json_backend.dumps(e, indent = None))
+          yield e
+        f.write(b"]")
+      os.replace(tmp_path, self.path_of(filename))
+    finally:
+      if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+  def _write(self, filename, content):
+    fd, tmp_path = tempfile.mkstemp(dir = self.directory, prefix = ".tmp-")
+    with os.fdopen(fd, "wb") as f:
+      f.write(content)
+    os.replace(tmp_path, self.path_of(filename))
+
+  # ⌵ Loading.
+
+  def load_file(self, filename):
+    return json_backend.load_path(self.path_of(filename))
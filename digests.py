@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-License-Identifier: ISC
+
+# Content digests of the generated files, shared by ⟦routines.py⟧ and
+# ⟦utils/common.py⟧.
+# The manifest (⟦digests.json⟧ in the top level directory) maps the name of
+# each generated file to the SHA-256 digest of its content and to the digests
+# of the inputs it was generated from, so that a stage can tell that its
+# output is already up to date without regenerating it.
+
+import os, json, hashlib
+
+MANIFEST_FILENAME = "digests.json"
+
+def sha256_of_file(path):
+  h = hashlib.sha256()
+  with open(path, "rb") as f:
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+      h.update(chunk)
+  return h.hexdigest()
+
+def sha256_of_bytes(content):
+  return hashlib.sha256(content).hexdigest()
+
+def manifest_from_path(path):
+  try:
+    with open(path, "r", encoding = "utf-8") as f:
+      return json.load(f)
+  except FileNotFoundError:
+    return dict()
+
+def save_manifest(manifest, path):
+  text = json.dumps(manifest, indent = 2, ensure_ascii = False, sort_keys = True)
+  if os.path.isfile(path):
+    with open(path, "r", encoding = "utf-8") as f:
+      if f.read() == text:
+        return
+  with open(path, "w", encoding = "utf-8", newline = "") as f:
+    f.write(text)
+
+def record(manifest, path, digest, inputs = None):
+  # Files are identified by their base name.
+  manifest[os.path.basename(path)] = {
+    "sha256": digest,
+    "inputs": dict() if inputs is None else inputs
+  }
+
+def is_up_to_date(manifest, path, inputs):
+  # Whether the file at ⟦path⟧ is unchanged since it was recorded as
+  # generated from inputs having the digests ⟦inputs⟧.
+  entry = manifest.get(os.path.basename(path))
+  return (
+    entry is not None and entry["inputs"] == inputs
+    and os.path.isfile(path) and sha256_of_file(path) == entry["sha256"])
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-License-Identifier: ISC
+
+# Compact in-memory representation of Toakao entries (see ⟦FORMAT.md⟧).
+# An ⟦Entry⟧ stores the fields common to all entries in slots, the
+# ⟪<lang>_definition⟫, ⟪<lang>_notes⟫, ⟪<lang>_gloss⟫ and ⟪<lang>_lem⟫ fields
+# in one ⟦Translation⟧ per language, and each item of ⟪langdata⟫ as a
+# ⟦LangData⟧; any other field is kept in a dict of extra fields.
+# The order of the fields of each record is kept as a tuple shared by all the
+# records having the same order, and field names and language codes are
+# interned, as are the values of the fields which take their values from a
+# small set (⟪type⟫, ⟪frame⟫, ⟪author⟫…); ⟦to_dict⟧ gives back the original
+# JSON object, key order included.
+# Records behave like the dicts they stand for (⟦e["lemma"]⟧, ⟦k in e⟧,
+# ⟦e.get(k)⟧, ⟦e.items()⟧…), so that they can be handed to code written for
+# dicts; ⟦json_backend⟧ serializes them through ⟦to_dict⟧.
+
+import sys
+from collections.abc import MutableMapping
+
+class _Absent:
+  # The marker of a field which is not set. It is a singleton, which copying
+  # and pickling preserve, so that copied records keep their missing fields
+  # missing.
+  __slots__ = ()
+  _instance = None
+
+  def __new__(cls):
+    if cls._instance is None:
+      cls._instance = object.__new__(cls)
+    return cls._instance
+
+  def __reduce__(self):
+    return "_ABSENT"
+
+  def __copy__(self):
+    return self
+
+  def __deepcopy__(self, memo):
+    return self
+
+  def __repr__(self):
+    return "_ABSENT"
+
+_ABSENT = _Absent()
+_KEY_ORDERS = dict()
+_INTERNED_VALUE_FIELDS = frozenset({
+  "discriminator", "type", "frame", "distribution", "pronominal_class",
+  "subject", "definition_type", "author"})
+
+def _interned_value(k, v):
+  if k in _INTERNED_VALUE_FIELDS and type(v) is str:
+    return sys.intern(v)
+  return v
+
+def _interned_key_order(keys):
+  keys = tuple(sys.intern(k) for k in keys)
+  return _KEY_ORDERS.setdefault(keys, keys)
+
+class _Record(MutableMapping):
+  # The subclasses define ⟦_slot_of⟧, which tells in which slot a field is
+  # stored, or ⟦None⟧ if it is not stored in a slot of its own.
+  __slots__ = ("_keys", "extras")
+
+  def _get(self, key):
+    slot = self._slot_of(key)
+    if slot is not None:
+      return getattr(self, slot)
+    if self.extras is None:
+      return _ABSENT
+    return self.extras.get(key, _ABSENT)
+
+  def _set(self, key, value):
+    slot = self._slot_of(key)
+    if slot is not None:
+      setattr(self, slot, value)
+    else:
+      if self.extras is None:
+        self.extras = dict()
+      self.extras[key] = value
+
+  def __getitem__(self, key):
+    value = self._get(key)
+    if value is _ABSENT:
+      raise KeyError(key)
+    return value
+
+  def __setitem__(self, key, value):
+    if self._get(key) is _ABSENT:
+      self._keys = _interned_key_order(self._keys + (key,))
+    self._set(key, value)
+
+  def __delitem__(self, key):
+    if self._get(key) is _ABSENT:
+      raise KeyError(key)
+    self._set(key, _ABSENT)
+    self._keys = _interned_key_order(k for k in self._keys if k != key)
+
+  def __contains__(self, key):
+    return self._get(key) is not _ABSENT
+
+  def __iter__(self):
+    return iter(self._keys)
+
+  def __len__(self):
+    return len(self._keys)
+
+  def __repr__(self):
+    return f"{type(self).__name__}({self.to_dict()!r})"
+
+  def to_dict(self):
+    return {k: self._get(k) for k in self._keys}
+
+# ==================================================================== #
+
+class LangData(_Record):
+  FIELDS = ("id", "author", "date", "score")
+  __slots__ = FIELDS
+
+  @staticmethod
+  def _slot_of(key):
+    return key if key in LangData.FIELDS else None
+
+  @classmethod
+  def from_dict(cls, d):
+    r = cls.__new__(cls)
+    for k in cls.FIELDS:
+      setattr(r, k, _ABSENT)
+    r.extras = None
+    r._keys = _interned_key_order(d.keys())
+    for k, v in d.items():
+      r._set(k, _interned_value(k, v))
+    return r
+
+class Translation:
+  # The fields of an entry in a given language, e.g. ⟪eng_definition⟫.
+  FIELDS = ("definition", "notes", "gloss", "lem")
+  __slots__ = FIELDS
+
+  def __init__(self):
+    for k in Translation.FIELDS:
+      setattr(self, k, _ABSENT)
+
+class Entry(_Record):
+  FIELDS = (
+    "lemma", "discriminator", "is_official", "type", "frame", "distribution",
+    "pronominal_class", "subject", "sememe", "examples", "synonyms",
+    "etymology", "etymological_notes", "langdata", "definition_type", "tags")
+  __slots__ = FIELDS + ("translations",)
+  # ⟦translations⟧ is a tuple of (language, ⟦Translation⟧) pairs, which is
+  # lighter than a dict for the one or two languages of most entries.
+
+  def _translation_of(self, lang):
+    for l, translation in self.translations:
+      if l == lang:
+        return translation
+    return None
+
+  @staticmethod
+  def _slot_of(key):
+    return key if key in _ENTRY_FIELD_SET else None
+
+  def _get(self, key):
+    if key in _ENTRY_FIELD_SET:
+      return getattr(self, key)
+    parsed = _TRANSLATION_KEYS.get(key) or _translation_key_of(key)
+    if parsed is not None:
+      lang, field = parsed
+      for l, translation in self.translations:
+        if l == lang:
+          return getattr(translation, field)
+      return _ABSENT
+    return _Record._get(self, key)
+
+  def __getitem__(self, key):
+    # Fast path for the most frequently accessed fields.
+    if key in _ENTRY_FIELD_SET:
+      value = getattr(self, key)
+      if value is not _ABSENT:
+        return value
+      raise KeyError(key)
+    value = self._get(key)
+    if value is _ABSENT:
+      raise KeyError(key)
+    return value
+
+  def __contains__(self, key):
+    if key in _ENTRY_FIELD_SET:
+      return getattr(self, key) is not _ABSENT
+    return self._get(key) is not _ABSENT
+
+  def __setitem__(self, key, value):
+    if key in _ENTRY_FIELD_SET:
+      if getattr(self, key) is _ABSENT:
+        self._keys = _interned_key_order(self._keys + (key,))
+      setattr(self, key, value)
+      return
+    _Record.__setitem__(self, key, value)
+
+  def _set(self, key, value):
+    if key in _ENTRY_FIELD_SET:
+      setattr(self, key, value)
+      return
+    parsed = _translation_key_of(key)
+    if parsed is not None:
+      lang, field = parsed
+      translation = self._translation_of(lang)
+      if translation is None:
+        translation = Translation()
+        self.translations += ((lang, translation),)
+      setattr(translation, field, value)
+      return
+    _Record._set(self, key, value)
+
+  @classmethod
+  def from_dict(cls, d):
+    r = cls.__new__(cls)
+    for k in cls.FIELDS:
+      setattr(r, k, _ABSENT)
+    r.translations = ()
+    r.extras = None
+    r._keys = _interned_key_order(d.keys())
+    for k, v in d.items():
+      if k == "langdata":
+        v = {
+          sys.intern(lang): LangData.from_dict(item)
+          for lang, item in v.items()}
+      r._set(k, _interned_value(k, v))
+    return r
+
+  def to_dict(self):
+    d = _Record.to_dict(self)
+    if "langdata" in d:
+      d["langdata"] = {
+        lang: item.to_dict() if isinstance(item, LangData) else item
+        for lang, item in d["langdata"].items()}
+    return d
+
+_ENTRY_FIELD_SET = frozenset(Entry.FIELDS)
+_TRANSLATION_KEYS = dict()
+
+def _translation_key_of(key):
+  # ⟪eng_definition⟫ ↦ (⟪eng⟫, ⟪definition⟫); ⟦None⟧ for other keys.
+  parsed = _TRANSLATION_KEYS.get(key, _ABSENT)
+  if parsed is _ABSENT:
+    lang, _, field = key.rpartition("_")
+    parsed = None
+    if lang != "" and field in Translation.FIELDS:
+      parsed = (sys.intern(lang), field)
+    _TRANSLATION_KEYS[key] = parsed
+  return parsed
+
+# ==================================================================== #
+
+def entries_from_dicts(dicts):
+  # Converts the dicts of the list into entries, in place, so that each dict
+  # can be freed as soon as it is converted.
+  for i, d in enumerate(dicts):
+    if isinstance(d, dict):
+      dicts[i] = Entry.from_dict(d)
+  return dicts
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-License-Identifier: ISC
+
+# HTTP routines shared by ⟦routines.py⟧ and ⟦utils/common.py⟧: requests with
+# timeouts and retries, and a persistent response cache keyed by URL.
+# Cached responses are revalidated with conditional requests (ETag and
+# Last-Modified), so that an unchanged remote file costs a single 304 reply.
+#
+# Environment variables:
+#   TOAKAO_CACHE_DIR        directory of the cache (default: ⟦.cache/http⟧)
+#   TOAKAO_CACHE_MAX_BYTES  size bound of the cache (default: 256 MiB)
+#   TOAKAO_CACHE_ONLY       if set to a non-empty value other than ⟪0⟫, never
+#                           access the network and serve cached bodies only
+
+import os, json, time, hashlib, tempfile
+import requests
+
+HTTP_TIMEOUT = 60   # seconds, for connecting and for each read
+HTTP_RETRIES = 3
+HTTP_RETRY_DELAY = 2  # seconds, doubled after each failed attempt
+
+CACHE_DIR = os.environ.get(
+  "TOAKAO_CACHE_DIR",
+  os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "http"))
+CACHE_MAX_BYTES = int(os.environ.get("TOAKAO_CACHE_MAX_BYTES", 256 * 2**20))
+CACHE_ONLY = os.environ.get("TOAKAO_CACHE_ONLY", "") not in ("", "0")
+
+def response_from_request(method, url, **kwargs):
+  # Performs an HTTP request, retrying on connection errors, timeouts and
+  # server-side (5××) errors; client-side errors are raised immediately.
+  delay = HTTP_RETRY_DELAY
+  for attempt in range(HTTP_RETRIES + 1):
+    try:
+      response = requests.request(
+        method, url, timeout = HTTP_TIMEOUT, **kwargs)
+      if response.status_code < 500 or attempt == HTTP_RETRIES:
+        response.raise_for_status()
+        return response
+    except (requests.ConnectionError, requests.Timeout):
+      if attempt == HTTP_RETRIES:
+        raise
+    time.sleep(delay)
+    delay *= 2
+
+def content_from_url(url):
+  meta = _cached_meta_of(url)
+  if CACHE_ONLY:
+    if meta is None:
+      raise LookupError(f"Cache-only mode: ⟪{url}⟫ is not cached.")
+    return _cached_body_of(url, meta)
+  headers = dict()
+  if meta is not None:
+    if meta["etag"] != "":
+      headers["If-None-Match"] = meta["etag"]
+    if meta["last_modified"] != "":
+      headers["If-Modified-Since"] = meta["last_modified"]
+  response = response_from_request("GET", url, headers = headers)
+  if response.status_code == 304 and meta is not None:
+    return _cached_body_of(url, meta)
+  assert response.status_code == 200, (
+    'Wrong status code :' + str(response.status_code))
+  content = response.content
+  if "ETag" in response.headers or "Last-Modified" in response.headers:
+    _store(url, response, content)
+  return content
+
+def chunks_from_url(url, chunk_size = 1 << 20):
+  # Same as ⟦content_from_url⟧, but yields the content chunk by chunk as it
+  # is received (or read from the cache), instead of holding all of it.
+  meta = _cached_meta_of(url)
+  if CACHE_ONLY:
+    if meta is None:
+      raise LookupError(f"Cache-only mode: ⟪{url}⟫ is not cached.")
+    yield from _cached_chunks_of(url, meta, chunk_size)
+    return
+  headers = dict()
+  if meta is not None:
+    if meta["etag"] != "":
+      headers["If-None-Match"] = meta["etag"]
+    if meta["last_modified"] != "":
+      headers["If-Modified-Since"] = meta["last_modified"]
+  response = response_from_request(
+    "GET", url, headers = headers, stream = True)
+  with response:
+    if response.status_code == 304 and meta is not None:
+      yield from _cached_chunks_of(url, meta, chunk_size)
+      return
+    assert response.status_code == 200, (
+      'Wrong status code :' + str(response.status_code))
+    chunks = response.iter_content(chunk_size)
+    if "ETag" in response.headers or "Last-Modified" in response.headers:
+      yield from _stored_chunks(url, response, chunks)
+    else:
+      yield from chunks
+
+def file_from_post(url, chunk_size = 1 << 20, **kwargs):
+  # The body of the response to a POST request, received chunk by chunk into
+  # an anonymous temporary file, which is returned rewound; such responses
+  # are not cached. Should the transfer be interrupted, the request is sent
+  # again, as in ⟦response_from_request⟧.
+  delay = HTTP_RETRY_DELAY
+  for attempt in range(HTTP_RETRIES + 1):
+    response = response_from_request("POST", url, stream = True, **kwargs)
+    f = tempfile.TemporaryFile()
+    try:
+      with response:
+        for chunk in response.iter_content(chunk_size):
+          f.write(chunk)
+      f.seek(0)
+      return f
+    except (
+      requests.ConnectionError, requests.Timeout,
+      requests.exceptions.ChunkedEncodingError
+    ):
+      f.close()
+      if attempt == HTTP_RETRIES:
+        raise
+    time.sleep(delay)
+    delay *= 2
+
+# ==================================================================== #
+
+def _cache_paths_of(url):
+  key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+  path = os.path.join(CACHE_DIR, key)
+  return (path + ".body", path + ".meta.json")
+
+def _cached_meta_of(url):
+  body_path, meta_path = _cache_paths_of(url)
+  if not (os.path.isfile(meta_path) and os.path.isfile(body_path)):
+    return None
+  try:
+    with open(meta_path, "r", encoding = "utf-8") as f:
+      meta = json.load(f)
+  except (OSError, ValueError):
+    return None
+  if meta.get("url") != url or meta.get("size") != os.path.getsize(body_path):
+    return None
+  return meta
+
+def _cached_body_of(url, meta):
+  body_path, meta_path = _cache_paths_of(url)
+  with open(body_path, "rb") as f:
+    content = f.read()
+  meta["accessed"] = time.time()
+  _write_atomically(meta_path, json.dumps(meta).encode("utf-8"))
+  return content
+
+def _cached_chunks_of(url, meta, chunk_size):
+  body_path, meta_path = _cache_paths_of(url)
+  meta["accessed"] = time.time()
+  _write_atomically(meta_path, json.dumps(meta).encode("utf-8"))
+  with open(body_path, "rb") as f:
+    yield from iter(lambda: f.read(chunk_size), b"")
+
+def _stored_chunks(url, response, chunks):
+  # Yields the chunks while writing them into the cache; the body is only
+  # committed to the cache once it has been fully received.
+  body_path, meta_path = _cache_paths_of(url)
+  os.makedirs(CACHE_DIR, exist_ok = True)
+  fd, tmp_path = tempfile.mkstemp(dir = CACHE_DIR, prefix = ".tmp-")
+  size = 0
+  try:
+    with os.fdopen(fd, "wb") as f:
+      for chunk in chunks:
+        f.write(chunk)
+        size += len(chunk)
+        yield chunk
+    os.replace(tmp_path, body_path)
+  finally:
+    if os.path.exists(tmp_path):
+      os.remove(tmp_path)
+  meta = {
+    "url": url,
+    "etag": response.headers.get("ETag", ""),
+    "last_modified": response.headers.get("Last-Modified", ""),
+    "size": size,
+    "accessed": time.time()
+  }
+  _write_atomically(meta_path, json.dumps(meta).encode("utf-8"))
+  _evict_beyond(CACHE_MAX_BYTES)
+
+def _store(url, response, content):
+  body_path, meta_path = _cache_paths_of(url)
+  os.makedirs(CACHE_DIR, exist_ok = True)
+  meta = {
+    "url": url,
+    "etag": response.headers.get("ETag", ""),
+    "last_modified": response.headers.get("Last-Modified", ""),
+    "size": len(content),
+    "accessed": time.time()
+  }
+  _write_atomically(body_path, content)
+  _write_atomically(meta_path, json.dumps(meta).encode("utf-8"))
+  _evict_beyond(CACHE_MAX_BYTES)
+
+def _evict_beyond(max_bytes):
+  # Least recently used responses are evicted first.
+  metas = []
+  for name in os.listdir(CACHE_DIR):
+    if name.endswith(".meta.json"):
+      path = os.path.join(CACHE_DIR, name)
+      try:
+        with open(path, "r", encoding = "utf-8") as f:
+          metas.append((json.load(f), path))
+      except (OSError, ValueError):
+        continue
+  total = sum(meta.get("size", 0) for meta, _ in metas)
+  metas.sort(key = lambda p: p[0].get("accessed", 0))
+  for meta, meta_path in metas:
+    if total <= max_bytes:
+      break
+    body_path = meta_path[: -len(".meta.json")] + ".body"
+    for path in (meta_path, body_path):
+      if os.path.exists(path):
+        os.remove(path)
+    total -= meta.get("size", 0)
+
+def _write_atomically(path, content):
+  fd, tmp_path = tempfile.mkstemp(
+    dir = os.path.dirname(path), prefix = ".tmp-")
+  try:
+    with os.fdopen(fd, "wb") as f:
+      f.write(content)
+    os.replace(tmp_path, path)
+  except:
+    os.remove(tmp_path)
+    raise
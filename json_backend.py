@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-License-Identifier: ISC
+
+# JSON backend shared by ⟦routines.py⟧ and ⟦utils/common.py⟧: ⟦orjson⟧ is
+# used when it is installed, the standard ⟦json⟧ module otherwise.
+# Either way, objects are decoded into plain (insertion-ordered) dicts, and
+# the encoded bytes are those of ⟦json.dumps(obj, indent = indent,
+# ensure_ascii = False)⟧ in UTF-8, so that the committed JSON files do not
+# depend on which backend produced them.
+# Objects having a ⟦to_dict⟧ method, such as the records of ⟦entry_model⟧,
+# are encoded as the dict it returns.
+# Top-level arrays can also be read and written one element at a time (see
+# ⟦array_gen_from_chunks⟧ and ⟦dump⟧), so that passes over large files run
+# in bounded memory.
+
+import io, json, codecs
+from collections.abc import Iterator
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+CHUNK_SIZE = 1 << 20
+
+def loads(data):
+  # ⟦data⟧ may be either bytes (UTF-8) or a string.
+  if orjson is not None:
+    return orjson.loads(data)
+  return json.loads(data)
+
+def load_path(path):
+  with open(path, "rb") as f:
+    return loads(f.read())
+
+def _default(obj):
+  to_dict = getattr(obj, "to_dict", None)
+  if to_dict is None:
+    raise TypeError(
+      f"Object of type {type(obj).__name__} is not JSON serializable")
+  return to_dict()
+
+def dump(obj, f, indent = 2):
+  # Writes the JSON text of ⟦obj⟧ into the binary file ⟦f⟧; an iterator
+  # (e.g. a generator) is written as an array, element by element.
+  if isinstance(obj, Iterator):
+    dump_array(obj, f, indent)
+    return
+  if orjson is not None and indent == 2:
+    # ⟦orjson⟧ only supports a 2-space indentation; it refuses what the
+    # standard module would accept otherwise (non-string keys, integers
+    # beyond 64 bits…), in which case the standard module takes over.
+    try:
+      f.write(orjson.dumps(
+        obj, default = _default, option = orjson.OPT_INDENT_2))
+      return
+    except TypeError:
+      pass
+  encoder = json.JSONEncoder(
+    indent = indent, ensure_ascii = False, default = _default)
+  if indent is None:
+    # Only the one-shot encoding benefits from the C accelerator.
+    chunks = (encoder.encode(obj),)
+  else:
+    chunks = encoder.iterencode(obj)
+  text = io.TextIOWrapper(f, encoding = "utf-8", newline = "")
+  for chunk in chunks:
+    text.write(chunk)
+  text.flush()
+  text.detach()
+
+def dumps(obj, indent = 2):
+  f = io.BytesIO()
+  dump(obj, f, indent)
+  return f.getvalue()
+
+def dump_array(elements, f, indent = 2):
+  # Same bytes as ⟦dump(list(elements), f, indent)⟧, without the list.
+  # Returns the number of elements.
+  if indent is None:
+    separator, closing = b", ", b"]"
+  else:
+    separator = b",\n" + b" " * indent
+    closing = b"\n]"
+  n = 0
+  for e in elements:
+    f.write(b"[" if n == 0 else separator)
+    if indent is not None:
+      if n == 0:
+        f.write(b"\n" + b" " * indent)
+      # JSON strings cannot hold raw newlines, so each newline of the text
+      # of an element is a line break to be indented one level deeper.
+      f.write(dumps(e, indent).replace(b"\n", b"\n" + b" " * indent))
+    else:
+      f.write(dumps(e, indent))
+    n += 1
+  f.write(b"[]" if n == 0 else closing)
+  return n
+
+# ==================================================================== #
+
+def array_gen_from_chunks(chunks, key = None):
+  # Yields the elements of the top-level JSON array whose text is split into
+  # the byte strings of ⟦chunks⟧, one at a time. With a ⟦key⟧, the array is
+  # the value of that member of a top-level object instead, e.g. ⟪results⟫
+  # for ⟪{"success": true, "results": […]}⟫.
+  # Elements are decoded with the standard module, as ⟦orjson⟧ cannot
+  # decode a prefix of a text.
+  reader = _TextReader(chunks)
+  if key is not None:
+    reader.expect("{")
+    while True:
+      c = reader.peek_nonspace()
+      if c == "}" or c is None:
+        raise LookupError(f"No ⟪{key}⟫ member in the JSON object.")
+      k = reader.value()
+      reader.expect(":")
+      if k == key:
+        break
+      reader.value()
+      if reader.peek_nonspace() == ",":
+        reader.expect(",")
+  reader.expect("[")
+  if reader.peek_nonspace() == "]":
+    return
+  while True:
+    yield reader.value()
+    c = reader.peek_nonspace()
+    reader.expect(c)
+    if c == "]":
+      return
+    if c != ",":
+      raise ValueError(f"Unexpected character in JSON array: ⟪{c}⟫.")
+
+def array_gen_from_path(path, key = None):
+  yield from array_gen_from_file(open(path, "rb"), key)
+
+def array_gen_from_file(f, key = None):
+  # Same as ⟦array_gen_from_path⟧, for a binary file, which is closed once
+  # the array has been read.
+  with f:
+    yield from array_gen_from_chunks(
+      iter(lambda: f.read(CHUNK_SIZE), b""), key)
+
+class _TextReader:
+  # Decoded text of a stream of UTF-8 chunks, read from left to right.
+  def __init__(self, chunks):
+    self.chunks = iter(chunks)
+    self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    self.text = ""
+    self.pos = 0
+    self.eof = False
+    self.scanner = json.JSONDecoder()
+
+  def _read(self):
+    # Appends the next chunk to the text; returns ⟦False⟧ at the end.
+    if self.eof:
+      return False
+    chunk = next(self.chunks, None)
+    if chunk is None:
+      self.eof = True
+      self.text = self.text[self.pos :] + self.decoder.decode(b"", True)
+    else:
+      self.text = self.text[self.pos :] + self.decoder.decode(chunk)
+    self.pos = 0
+    return True
+
+  def peek_nonspace(self):
+    while True:
+      n = len(self.text)
+      while self.pos < n and self.text[self.pos] in " \t\n\r":
+        self.pos += 1
+      if self.pos < n:
+        return self.text[self.pos]
+      if not self._read():
+        return None
+
+  def expect(self, c):
+    if self.peek_nonspace() != c:
+      raise ValueError(f"Expected ⟪{c}⟫ in JSON text.")
+    self.pos += 1
+
+  def value(self):
+    self.peek_nonspace()
+    while True:
+      try:
+        value, end = self.scanner.raw_decode(self.text, self.pos)
+        # A number may go on in the next chunk: a value is only complete
+        # once followed by what may follow a value, or a member name.
+        if self.eof or (
+          end < len(self.text) and self.text[end] in ",]}: \t\n\r"
+        ):
+          self.pos = end
+          return value
+      except json.JSONDecodeError:
+        if self.eof:
+          raise
+      self._read()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-License-Identifier: ISC
+
+# Per-stage instrumentation of a pipeline such as ⟦update.py⟧'s: for each
+# named stage, the wall time, the CPU time, the peak memory allocated during
+# the stage (traced with ⟦tracemalloc⟧) and an optional entry count are
+# recorded, and written as a JSON report. The cProfile statistics of each
+# stage may also be dumped into a directory, one ⟦.prof⟧ file per stage.
+# A disabled profiler measures nothing, so stages cost nothing extra.
+
+import os, sys, json, time, cProfile, tracemalloc
+from contextlib import contextmanager
+
+class StageProfiler:
+  def __init__(self, enabled = False, cprofile_dir = None, trace_memory = True):
+    # Tracing the allocations slows the traced code down; with
+    # ⟦trace_memory = False⟧, only times and entry counts are recorded.
+    self.enabled = enabled
+    self.cprofile_dir = cprofile_dir
+    self.trace_memory = trace_memory
+    self.stages = []
+
+  @contextmanager
+  def stage(self, name):
+    # Yields the record of the stage, a dict in which the caller may set
+    # ⟪entries⟫, the number of entries produced by the stage.
+    record = {"name": name, "entries": None}
+    if not self.enabled:
+      yield record
+      return
+    if self.trace_memory:
+      if not tracemalloc.is_tracing():
+        tracemalloc.start()
+      tracemalloc.reset_peak()
+      memory_before, _ = tracemalloc.get_traced_memory()
+    profiler = None
+    if self.cprofile_dir is not None:
+      profiler = cProfile.Profile()
+      profiler.enable()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+      yield record
+    finally:
+      record["wall_time"] = time.perf_counter() - wall_start
+      record["cpu_time"] = time.process_time() - cpu_start
+      if profiler is not None:
+        profiler.disable()
+        os.makedirs(self.cprofile_dir, exist_ok = True)
+        profiler.dump_stats(os.path.join(
+          self.cprofile_dir,
+          f"{len(self.stages) + 1:02d}-{name.replace(' ', '_')}.prof"))
+      if self.trace_memory:
+        memory_after, peak = tracemalloc.get_traced_memory()
+        record["peak_memory"] = peak - memory_before
+        record["memory_delta"] = memory_after - memory_before
+      else:
+        record["peak_memory"] = record["memory_delta"] = None
+      self.stages.append(record)
+
+  def report(self):
+    return {
+      "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+      "python": sys.version.split()[0],
+      "stages": self.stages,
+      "total": {
+        "wall_time": sum(r["wall_time"] for r in self.stages),
+        "cpu_time": sum(r["cpu_time"] for r in self.stages),
+        "peak_memory": max(
+          [r["peak_memory"] or 0 for r in self.stages] + [0])
+      }
+    }
+
+  def save_report(self, path):
+    with open(path, "w", encoding = "utf-8") as f:
+      json.dump(self.report(), f, indent = 2, ensure_ascii = False)
+
+  def print_summary(self):
+    for r in self.stages:
+      entries = "" if r["entries"] is None else f" {r['entries']:>8} entries"
+      memory = (
+        "" if r["peak_memory"] is None
+        else f"{r['peak_memory'] / 2**20:9.1f} MiB peak")
+      print(
+        f"  {r['name']:<24} {r['wall_time']:8.3f} s wall "
+        + f"{r['cpu_time']:8.3f} s CPU {memory}{entries}")
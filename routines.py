@@ -2,9 +2,10 @@
 
 # SPDX-License-Identifier: ISC
 
-import os, io, csv, json
-import requests
-from collections import OrderedDict
+import os, io, csv, shutil, tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import http_routines, json_backend, digests, entry_model
+from digests import sha256_of_file
 from ruamel.yaml import YAML
 
 yaml = YAML(typ = "rt", pure = True)
@@ -15,32 +16,28 @@ def edit_json_from_path(input_path, function, output_path = None):
     output_path = (lambda t: t[0] + "-out" + t[1])(
       os.path.splitext(input_path)
     )
-  if input_path == output_path:
-    inputf = outputf = open(output_path, "rb+")
-    input = inputf.read().decode('utf-8')
-  else:
-    inputf = open(input_path,  "r", encoding = "utf8")
-    outputf = open(output_path, "wb")
-    input = inputf.read()
-  obj = json.loads(input, object_pairs_hook = OrderedDict)
-  if outputf == inputf:
-    outputf.seek(0)
-  outputf.truncate()
-  outputf.write(
-    bytes(
-      json.dumps(function(obj), indent = 2, ensure_ascii = False),
-      encoding = "utf8"
-    )
-  )
-  inputf.close()
-  outputf.close()
+  obj = json_backend.load_path(input_path)
+  save_as_json_file(function(obj), output_path)
 
 def object_from_json_path(path):
-  with open(path, "r", encoding = "utf-8") as f:
-    return json.loads(f.read(), object_pairs_hook = OrderedDict)
+  return json_backend.load_path(path)
 
 dicts_from_json_path = object_from_json_path
 
+def entries_from_json_path(path):
+  # The Toakao entries of the file, as ⟦entry_model.Entry⟧ objects.
+  return entry_model.entries_from_dicts(json_backend.load_path(path))
+
+# The ⟦…_gen_from_…⟧ functions yield the elements of a top-level JSON array
+# one at a time, or those of the array under ⟦key⟧ in a top-level object.
+
+def dicts_gen_from_json_path(path, key = None):
+  return json_backend.array_gen_from_path(path, key)
+
+def entries_gen_from_json_path(path):
+  for d in json_backend.array_gen_from_path(path):
+    yield entry_model.Entry.from_dict(d)
+
 def object_from_yaml_path(path):
   with open(path, "r", encoding = "utf-8") as f:
     return yaml.load(f.read())
@@ -58,17 +55,19 @@ def table_gen_from_csv_path(path, delimiter = ','):
     return csv.reader(f, delimiter = delimiter)
 
 def _content_from_url(url):
-  response = requests.get(url)
-  response.raise_for_status()
-  assert response.status_code == 200, (
-    'Wrong status code :' + str(response.status_code))
-  return response.content
+  # Responses are cached on disk and revalidated with conditional requests;
+  # see ⟦http_routines.py⟧.
+  return http_routines.content_from_url(url)
 
 def object_from_json_url(url):
-  return json.loads(_content_from_url(url))
+  return json_backend.loads(_content_from_url(url))
 
 dicts_from_json_url = object_from_json_url
 
+def dicts_gen_from_json_url(url, key = None):
+  return json_backend.array_gen_from_chunks(
+    http_routines.chunks_from_url(url), key)
+
 def object_from_yaml_url(url):
   return yaml.load(_content_from_url(url))
 
@@ -122,13 +121,104 @@ def save_dicts_as_csv_file(dicts, path, delimiter = ','):
     table.insert(0, keys)
     csv.writer(o, delimiter = delimiter).writerows(table)
 
-def save_as_json_file(dicts, path, indent = 2):
-  with open(path, "wb") as o:
-    o.truncate()
-    o.write(bytes(
-      json.dumps(dicts, indent = indent, ensure_ascii = False),
-      encoding = "utf8"
-    ))
+def save_as_json_file(dicts, path, indent = 2, manifest = None):
+  # The JSON text is written into a temporary file, which then atomically
+  # replaces the file at ⟦path⟧: an interrupted save never leaves a truncated
+  # file behind. With the standard ⟦json⟧ backend, the text is streamed
+  # chunk by chunk.
+  # A file whose content would not change is left untouched, modification
+  # time included. Returns whether the file was written; the digest of its
+  # content is recorded into ⟦manifest⟧ if one is given (see ⟦digests.py⟧).
+  is_changed, digest = _replaced_if_changed(
+    path, lambda o: json_backend.dump(dicts, o, indent))
+  if manifest is not None:
+    digests.record(manifest, path, digest)
+  return is_changed
+
+def save_as_json_files(
+  objects_by_path, indent = 2, max_workers = None, manifest = None
+):
+  # Saves independent objects concurrently, one file per object.
+  # Returns the list of the paths of the files which were written.
+  with ThreadPoolExecutor(max_workers = max_workers) as executor:
+    futures = {
+      path: executor.submit(save_as_json_file, obj, path, indent, manifest)
+      for path, obj in objects_by_path.items()
+    }
+    return [path for path, future in futures.items() if future.result()]
+
+class ChunkedPool:
+  # Applies ⟦function⟧ to items submitted one at a time, by chunks of
+  # ⟦chunk_size⟧ items, each chunk being processed by one of ⟦workers⟧
+  # worker processes while the next items are still being submitted;
+  # ⟦results⟧ then yields the results in submission order.
+  # With a single worker, or fewer items than a chunk, everything is done
+  # serially in this process, sparing the cost of starting the pool and of
+  # pickling; ⟦function⟧ must otherwise be a module-level function, and the
+  # items and their results must be picklable.
+  def __init__(self, function, workers = None, chunk_size = 1000):
+    self.function = function
+    self.workers = workers if workers is not None else (os.cpu_count() or 1)
+    self.chunk_size = chunk_size
+    self._chunk = []
+    self._futures = []
+    self._executor = None
+
+  def submit(self, item):
+    self._chunk.append(item)
+    if self.workers > 1 and len(self._chunk) >= self.chunk_size:
+      if self._executor is None:
+        self._executor = ProcessPoolExecutor(max_workers = self.workers)
+      self._futures.append(
+        self._executor.submit(_mapped, self.function, self._chunk))
+      self._chunk = []
+
+  def results(self):
+    try:
+      # The last chunk is processed here while the workers are busy.
+      last_results = _mapped(self.function, self._chunk)
+      for future in self._futures:
+        yield from future.result()
+      yield from last_results
+    finally:
+      if self._executor is not None:
+        self._executor.shutdown(cancel_futures = True)
+      self._executor = None
+      self._futures = []
+      self._chunk = []
+
+def _mapped(function, items):
+  return [function(item) for item in items]
+
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _replaced_if_changed(path, write):
+  # ⟦write⟧ writes the new content into the binary file it is given.
+  # Returns whether the file at ⟦path⟧ changed, and the digest of its content.
+  fd, tmp_path = tempfile.mkstemp(
+    dir = os.path.dirname(os.path.abspath(path)), prefix = ".tmp-")
+  try:
+    with os.fdopen(fd, "wb") as o:
+      write(o)
+    digest = sha256_of_file(tmp_path)
+    is_changed = not (
+      os.path.isfile(path)
+      and os.path.getsize(path) == os.path.getsize(tmp_path)
+      and sha256_of_file(path) == digest)
+    if not is_changed:
+      os.remove(tmp_path)
+      return (False, digest)
+    if os.path.exists(path):
+      shutil.copymode(path, tmp_path)
+    else:
+      os.chmod(tmp_path, 0o666 & ~_UMASK)
+    os.replace(tmp_path, path)
+  except:
+    if os.path.exists(tmp_path):
+      os.remove(tmp_path)
+    raise
+  return (True, digest)
 
 def save_as_yaml_file(obj, path, indent = 2):
   yaml.indent(mapping = indent, sequence = indent * 2, offset = indent)
@@ -140,7 +230,7 @@ def keys_and_table_from_dict(dicts):
   keys = []
   table = []
   for d in dicts:
-    assert isinstance(d, (dict, OrderedDict)), (
+    assert isinstance(d, dict), (
       f"keys_and_table_from_dict(): Wrong element type: {type(d)}")
     for k in d.keys():
       if k not in keys:
@@ -162,7 +252,7 @@ def dict_from_key_value(dictionaries, key, value):
   for d in dictionaries:
     if isinstance(d, (list, tuple, set, frozenset)):
       d = dict(d)
-    if isinstance(d, (dict, OrderedDict)) and key in d:
+    if isinstance(d, dict) and key in d:
       if d[key] == value:
         return d
   return None
@@ -174,7 +264,7 @@ def dict_index_from_key_value(dictionaries, key, value):
     d = dictionaries[i]
     if isinstance(d, (list, tuple, set, frozenset)):
       d = dict(d)
-    if isinstance(d, (dict, OrderedDict)) and key in d:
+    if isinstance(d, dict) and key in d:
       if d[key] == value:
         return i
     i += 1
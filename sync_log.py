@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-License-Identifier: ISC
+
+# Structured log of the synchronization performed by ⟦update.py⟧.
+# Each event has a type, a level and a few JSON fields; the events at or
+# above the recording level are buffered and written as JSON lines, and
+# those at or above the console level are also printed. Debugging events,
+# which may carry whole entries, are only built for the lemmas given as
+# ⟦debug_lemmas⟧, so that they cost a mere set lookup otherwise.
+# When the log is closed, a summary (the number of events of each type) and
+# the changeset of the synchronization are appended to the log.
+
+import os, json
+from collections import Counter
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+LEVEL_SYMBOLS = {"debug": "●", "info": "𖣔", "warning": "⚠", "error": "⚠⚠⚠"}
+
+BUFFER_SIZE = 4096
+
+class EventLog:
+  def __init__(
+    self, path = None, level = "info", console_level = "warning",
+    debug_lemmas = ()
+  ):
+    self.path = path
+    self.level = LEVELS[level]
+    if debug_lemmas:
+      # Debugging events are requested by lemma, and are always recorded.
+      self.level = min(self.level, LEVELS["debug"])
+    self.console_level = LEVELS[console_level]
+    self.debug_lemmas = frozenset(debug_lemmas)
+    self.counts = Counter()
+    self.added = []
+    self.removed = []
+    self.changed = dict()
+    self._buffer = []
+    self._file = None
+
+  def debugs(self, *lemmas):
+    # Whether debugging events shall be emitted for any of these lemmas.
+    return any(lemma in self.debug_lemmas for lemma in lemmas)
+
+  def event(self, level, type, **fields):
+    self.counts[type] += 1
+    n = LEVELS[level]
+    if n >= self.level and self.path is not None:
+      self._buffer.append({"level": level, "type": type, **fields})
+      if len(self._buffer) >= BUFFER_SIZE:
+        self.flush()
+    if n >= self.console_level:
+      print(console_line_of(level, type, fields))
+
+  def debug(self, type, **fields):
+    self.event("debug", type, **fields)
+
+  def info(self, type, **fields):
+    self.event("info", type, **fields)
+
+  def warning(self, type, **fields):
+    self.event("warning", type, **fields)
+
+  def error(self, type, **fields):
+    self.event("error", type, **fields)
+
+  # ⌵ Changeset.
+
+  def record_addition(self, lemma, discriminator):
+    self.added.append(f"{lemma}#{discriminator}")
+
+  def record_removal(self, lemma, discriminator):
+    self.removed.append(f"{lemma}#{discriminator}")
+
+  def record_change(self, lemma, discriminator, field, old, new):
+    changes = self.changed.setdefault(f"{lemma}#{discriminator}", dict())
+    if field in changes:
+      changes[field]["new"] = new
+    else:
+      changes[field] = {"old": old, "new": new}
+
+  def changeset(self):
+    return {
+      "added": self.added,
+      "removed": self.removed,
+      "changed": self.changed
+    }
+
+  def summary(self):
+    return dict(sorted(self.counts.items()))
+
+  # ⌵ Output.
+
+  def flush(self):
+    if self._buffer == [] or self.path is None:
+      return
+    if self._file is None:
+      directory = os.path.dirname(self.path)
+      if directory != "":
+        os.makedirs(directory, exist_ok = True)
+      self._file = open(self.path, "w", encoding = "utf-8", newline = "\n")
+    self._file.write("".join(
+      json.dumps(e, ensure_ascii = False, default = str) + "\n"
+      for e in self._buffer))
+    self._buffer = []
+
+  def close(self):
+    if self.path is not None:
+      self._buffer.append({"type": "summary", "counts": self.summary()})
+      self._buffer.append({"type": "changeset", **self.changeset()})
+      self.flush()
+    if self._file is not None:
+      self._file.close()
+      self._file = None
+
+  def print_summary(self):
+    print(
+      f"❖ ADDED ×{len(self.added)}, REMOVED ×{len(self.removed)}, "
+      + f"CHANGED ×{len(self.changed)}.")
+    for type, n in self.summary().items():
+      print(f"  {type}: {n}")
+
+def console_line_of(level, type, fields):
+  # E.g. ⟪⚠ new-polyseme: lemma=⟪…⟫ discriminator=⟪…⟫⟫.
+  return (
+    f"{LEVEL_SYMBOLS[level]} {type}: "
+    + " ".join(f"{k}=⟪{v}⟫" for k, v in fields.items()))
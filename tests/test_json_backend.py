@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-License-Identifier: ISC
+
+# Checks that ⟦json_backend.array_gen_from_chunks⟧ decodes the elements of a
+# top-level array as soon as their chunks are read.
+
+import sys, os, json
+
+_TOP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, _TOP_DIR)
+
+import json_backend
+
+CHUNK_SIZE = 4096
+
+def chunks_of(content, consumed):
+  # The chunks of ⟦content⟧, counting into ⟦consumed⟧ those which are read.
+  for i in range(0, len(content), CHUNK_SIZE):
+    consumed[0] += 1
+    yield content[i : i + CHUNK_SIZE]
+
+def elements(count):
+  return [
+    {"id": f"e{i}", "body": "▯ is a number.", "score": i}
+    for i in range(count)]
+
+def test_first_element_is_decoded_from_the_first_chunks():
+  content = json.dumps({"success": True, "results": elements(10_000)}).encode()
+  consumed = [0]
+  results = json_backend.array_gen_from_chunks(
+    chunks_of(content, consumed), "results")
+  assert next(results) == elements(1)[0]
+  assert consumed[0] <= 2 < len(content) // CHUNK_SIZE
+
+def test_members_are_skipped_up_to_the_key():
+  document = {
+    "success": True, "count": 12345, "meta": {"a": [1, 2.5]},
+    "results": elements(500)}
+  content = json.dumps(document, indent = 1).encode()
+  consumed = [0]
+  results = list(json_backend.array_gen_from_chunks(
+    chunks_of(content, consumed), "results"))
+  assert results == elements(500)
+  assert consumed[0] == -(-len(content) // CHUNK_SIZE)
+
+def test_numbers_split_across_chunks():
+  content = json.dumps([123456789] * 5000).encode()
+  assert list(json_backend.array_gen_from_chunks(
+    chunks_of(content, [0]))) == [123456789] * 5000
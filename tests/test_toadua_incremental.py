@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-License-Identifier: ISC
+
+# Checks that the incremental reformating of Toadua entries (see
+# ⟦update.reformated_toadua_incrementally⟧) gives the same results as a full
+# refresh, the entries being downloaded from a local stand-in for the Toadua
+# API.
+
+import sys, os, json, copy, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+
+_TOP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, _TOP_DIR)
+
+import update
+
+def toadua_entry(id, head, body, notes = (), score = 1, user = "user"):
+  return {
+    "id": id, "date": "2024-01-01T00:00:00.000Z", "head": head,
+    "body": body, "user": user, "scope": "en",
+    "notes": [toadua_note(content, user) for content in notes],
+    "score": score, "votes": {}
+  }
+
+def toadua_note(content, user = "user", date = "2024-01-02T00:00:00.000Z"):
+  return {"date": date, "user": user, "content": content}
+
+INITIAL_ENTRIES = [
+  toadua_entry("a1", "kue", "▯ is a chicken.", ["type: predicate"]),
+  toadua_entry("a2", "sao", "▯ is big.", ["sememe: BIG", "frame: c"]),
+  toadua_entry("a3", "jıo", "▯ builds ▯.", ["frame: c c"]),
+  toadua_entry("a4", "nuo", "▯ sleeps."),
+  toadua_entry("a5", "kuaq", "▯ is low.", score = -1),
+  toadua_entry("a6", "the kue", "Not a lemma.")
+]
+
+class ToaduaStandIn:
+  # Serves the search results of ⟦entries⟧, whatever the query.
+  def __init__(self, entries):
+    self.entries = entries
+    stand_in = self
+
+    class Handler(BaseHTTPRequestHandler):
+      def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps(
+          {"success": True, "results": stand_in.entries}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      def log_message(self, *args):
+        pass
+
+    self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api"
+    threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+@pytest.fixture
+def toadua(monkeypatch):
+  stand_in = ToaduaStandIn(copy.deepcopy(INITIAL_ENTRIES))
+  monkeypatch.setattr(update, "TOADUA_API_URL", stand_in.url)
+  yield stand_in
+  stand_in.server.shutdown()
+  stand_in.server.server_close()
+
+def downloaded_entries():
+  return update.toadua_entries_from_api(update.TOADUA_SEARCH_ALL_QUERY)
+
+def incremental_run(state):
+  entries, _, state = update.reformated_toadua_incrementally(
+    downloaded_entries(), state)
+  return (entries, state)
+
+def full_refresh():
+  entries, _ = update.reformated_toadua(downloaded_entries())
+  return entries
+
+def by_id(entries):
+  return {t["id"]: e for e in entries for t in e["translations"]}
+
+def test_unchanged_entries_are_taken_from_the_state(toadua):
+  entries, state = incremental_run(None)
+  assert entries == full_refresh()
+  assert set(state["entries"]) == {e["id"] for e in INITIAL_ENTRIES}
+  again, again_state = incremental_run(state)
+  assert again == entries
+  assert again_state is state
+
+def test_changed_entries_are_reformated_again(toadua):
+  _, state = incremental_run(None)
+  # Editing an entry renews its date.
+  toadua.entries[1]["body"] = "▯ is huge."
+  toadua.entries[1]["date"] = "2024-02-01T00:00:00.000Z"
+  toadua.entries[2]["notes"].append(
+    toadua_note("frame: c 1", date = "2024-02-01T00:00:00.000Z"))
+  toadua.entries[4]["score"] = 2
+  entries, state = incremental_run(state)
+  assert entries == full_refresh()
+  assert by_id(entries)["a2"]["translations"][0]["definition"] == "▯ is huge."
+  assert by_id(entries)["a3"]["frame"] == "c 1"
+  assert "a5" in by_id(entries)
+
+def test_appended_notes_change_the_fingerprint(toadua):
+  entry = toadua.entries[1]
+  fingerprint = update.toadua_fingerprint_of(entry)
+  entry["notes"].append(toadua_note("sememe: LARGE"))
+  assert update.toadua_fingerprint_of(entry) != fingerprint
+
+def test_removed_entries_are_dropped(toadua):
+  _, state = incremental_run(None)
+  del toadua.entries[0]
+  del toadua.entries[2]
+  entries, state = incremental_run(state)
+  assert entries == full_refresh()
+  assert set(state["entries"]) == {e["id"] for e in toadua.entries}
+  assert "a1" not in by_id(entries) and "a4" not in by_id(entries)
+
+def test_new_entries_are_added(toadua):
+  _, state = incremental_run(None)
+  toadua.entries.insert(2, toadua_entry("a7", "poq", "▯ is a person."))
+  entries, state = incremental_run(state)
+  assert entries == full_refresh()
+  assert "a7" in by_id(entries)
+
+def test_state_is_discarded_when_its_inputs_change(toadua, tmp_path):
+  _, state = incremental_run(None)
+  inputs = update.toadua_state_inputs_of(_TOP_DIR)
+  state["inputs"] = inputs
+  path = str(tmp_path / "toadua-state.json")
+  with open(path, "w", encoding = "utf-8") as f:
+    json.dump(state, f)
+  assert update.toadua_state_from_path(path, inputs) == state
+  changed = dict(inputs, **{"toaq_text.py": "0" * 64})
+  assert update.toadua_state_from_path(path, changed) is None
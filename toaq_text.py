@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+# SPDX-License-Identifier: ISC
+
+# Precompiled and memoized counterparts of some routines of the vendored
+# ⟦dep.pytoaq.latin⟧ module, for the hot paths of ⟦update.py⟧.
+# ⟦dep/⟧ only holds verbatim copies of upstream modules (see ⟦dep/README.md⟧),
+# so the patterns and word sets below are built from those of the copy, and
+# give the same results as the corresponding ⟦dep.pytoaq.latin⟧ functions.
+# Character replacements are performed with cached translation tables; the
+# vendored module itself is left as it is.
+
+import re
+from functools import lru_cache
+import dep.pytoaq.latin as pytoaq
+
+LEMMA_CACHE_SIZE = 1 << 16
+
+TONED_VOWELS = "áéíóúâêîôûäëïöü"
+TONELESS_VOWELS = "aeıouaeıouaeıou"
+
+# ==================================================================== #
+
+@lru_cache(maxsize = 256)
+def character_table(src_chars, dst_chars):
+  # Translation table replacing each character of ⟦src_chars⟧ with the
+  # character at the same position in ⟦dst_chars⟧ (at the first position,
+  # should a character occur more than once in ⟦src_chars⟧).
+  table = dict()
+  for c, d in zip(src_chars, dst_chars):
+    table.setdefault(ord(c), d)
+  return table
+
+def with_replaced_characters(s, src_chars, dst_chars):
+  return s.translate(character_table(src_chars, dst_chars))
+
+def without_tones(s):
+  return with_replaced_characters(s, TONED_VOWELS, TONELESS_VOWELS)
+
+# ==================================================================== #
+
+_INFLECTED_CONTENTIVE_PATTERN = re.compile(
+  f"([{pytoaq.std_consonant_str}]h?)?"
+  + f"[{pytoaq.std_vowel_str}]"
+  + f"[aeıou]*[mq]?(([{pytoaq.std_consonant_str}]h?)[aeıouạẹı̣ọụ]+[mq]?)*$")
+
+_PREFIX_LEMMA_PATTERN = re.compile(
+  f"(([{pytoaq.std_word_initial_str}]h?)?)?[aeıou]+[mq]?-$")
+
+_CONTENTIVE_LEMMA_PATTERN = re.compile(
+  f"([{pytoaq.std_word_initial_str}]h?)?[aeıouạẹı̣ọụ]+[mq]?"
+  + f"(([{pytoaq.std_consonant_str}]h?)[aeıouạẹı̣ọụ]+[mq]?)*$")
+
+_FUNCTION_LEMMAS = frozenset(
+  pytoaq.toneless_particles | pytoaq.functors_with_lexical_tone
+  | pytoaq.interjections)
+
+def is_an_inflected_contentive(s):
+  return None != _INFLECTED_CONTENTIVE_PATTERN.match(s)
+
+def is_a_prefix_lemma(s):
+  return None != _PREFIX_LEMMA_PATTERN.match(s)
+
+def is_a_contentive_lemma(s):
+  if len(s) == 0:
+    return False
+  s = s[0].lower().replace("i", "ı") + s[1:]
+  return None != _CONTENTIVE_LEMMA_PATTERN.match(s)
+
+@lru_cache(maxsize = LEMMA_CACHE_SIZE)
+def is_a_lemma(s):
+  return (
+    is_a_contentive_lemma(s) or is_a_prefix_lemma(s)
+    or s in _FUNCTION_LEMMAS)
@@ -6,15 +6,27 @@
 # PURPOSE:
 # This script synchronizes the content of the ⟦toakao.json⟧ file with the official Toaq dictionary and the Toadua community dictionary, fetching their data over the Internet; it also produces various JSON files storing dictionary entries which were discarded, such as non-lemma entries and disfavored competing wordings of definitions.
 
-# USAGE: $ python update.py
-# OUTPUT: toakao.json, nonlemmas.json, muakao.json, orphanes.json, deleted.json, discarded.json, ignored.json
+# USAGE: $ python update.py [--full] [--workers N] [--profile [REPORT]] [--cprofile-dir DIR] [--log PATH] [--log-level LEVEL] [--verbosity LEVEL] [--debug-lemma LEMMA]… [--dry-run [CHANGESET]] [--check] [--apply CHANGESET] [--no-checkpoints] [--replay STAGE [--run RUN_ID]]
+#   Each run saves checkpoints of its inputs and intermediate data into ⟦CHECKPOINTS_DIRNAME⟧ (unless ⟪--no-checkpoints⟫, ⟪--dry-run⟫ or ⟪--check⟫ is given), from which ⟪--replay STAGE [--run RUN_ID]⟫ reruns the pipeline offline (see ⟦checkpoints.py⟧).
+#   ⟪--dry-run⟫ and ⟪--check⟫ leave the output files untouched; the changeset saved by ⟪--dry-run⟫ can later be written with ⟪--apply⟫ (see ⟦changeset.py⟧).
+#   By default, Toadua entries which are unchanged since the previous run are not reprocessed (see ⟦TOADUA_STATE_FILENAME⟧), unless the code reformating them has changed (see ⟦TOADUA_STATE_INPUTS⟧); ⟪--full⟫ forces a full refresh, which also happens automatically every ⟦TOADUA_FULL_REFRESH_INTERVAL⟧ seconds.
+#   The entries are reformated serially, or by ⟪--workers⟫ processes, by chunks of ⟦REFORMAT_CHUNK_SIZE⟧ entries; smaller inputs are always reformated serially.
+# OUTPUT: toakao.json, nonlemmas.json, muakao.json, orphanes.json, deleted.json, discarded.json, ignored.json; files whose content is unchanged are not rewritten, and the digests of all of them are recorded in ⟦digests.json⟧. The events of the synchronization, followed by a summary and the resulting changeset, are logged as JSON lines into ⟦SYNC_LOG_FILENAME⟧.
 
 # ==================================================================== #
 
-import sys, os, time, io, subprocess, requests
-import json, csv, re
+import sys, os, gc, time, copy
+import re, argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import dep.pytoaq.latin as pytoaq
+from functools import lru_cache
+from itertools import groupby, chain
+import digests, toaq_text, http_routines, json_backend
+from profiling import StageProfiler
+from sync_log import EventLog, LEVELS
+from entry_model import entries_from_dicts
+import changeset as changesets
+from checkpoints import CheckpointRun, STAGES as CHECKPOINT_STAGES
 from routines import *
 
 # ==================================================================== #
@@ -22,94 +34,374 @@ from routines import *
 TOADUA_SCORE_THRESHOLD = 0
 
 OFFICIAL_DICTIONARY_URL = "https://raw.githubusercontent.com/toaq/dictionary/master/dictionary.json"
-TOADUA_DOWNLOAD_COMMAND = 'wget -O- https://toadua.uakci.space/api --post-data \'{"action":"search","query":["term",""]}\' | jq .results'
+TOADUA_API_URL = "https://toadua.uakci.space/api"
+TOADUA_SEARCH_ALL_QUERY = {"action": "search", "query": ["term", ""]}
+
+TOADUA_STATE_FILENAME = os.path.join(".cache", "toadua-state.json")
+TOADUA_STATE_VERSION = 4
+# The source files on which the reformated entries of the state depend; the
+# state is discarded whenever one of them changes.
+TOADUA_STATE_INPUTS = ("update.py", "toaq_text.py", "dep/pytoaq/latin.py")
+TOADUA_FULL_REFRESH_INTERVAL = 7 * 24 * 3600
+
+REFORMAT_CHUNK_SIZE = 2000
+
+SYNC_LOG_FILENAME = os.path.join(".cache", "sync-log.jsonl")
+CHECKPOINTS_DIRNAME = os.path.join(".cache", "checkpoints")
 
 
 # ==================================================================== #
 
-def entrypoint(this_path):
+def entrypoint(this_path, *args):
+	options = parsed_options(args)
 	t1 = time.time()
 	this_dir = os.path.dirname(os.path.abspath(this_path)) + os.path.sep
 	soakue_path = this_dir + "soakue-toakue.json"
 	toakao_path = this_dir + "toakao.json"
 	idmap_path = this_dir + "id-map.csv"
+	idmap_index_path = this_dir + "id-map.json"
 	nonlemmas_path = this_dir + "nonlemmas.json"
 	muakao_path = this_dir + "muakao.json"
 	deleted_path = this_dir + "deleted.json"
 	discarded_path = this_dir + "discarded.json"
 	ignored_path = this_dir + "ignored.json"
-	print("Collecting remote vocabulary sources…")
-	try:
-		step_desc = "attempting to download the official dictionary"
-		official_dict = dicts_from_json_url(OFFICIAL_DICTIONARY_URL)
-		step_desc = "attempting to download the Toadua dictionary"
-		result = subprocess.run(
-			TOADUA_DOWNLOAD_COMMAND,
-			shell = True, capture_output = True, text = True
-		)
-		assert result.stdout not in {None, ""}
-		toadua = json.loads(result.stdout)
-	except:
+	toadua_state_path = this_dir + TOADUA_STATE_FILENAME
+	manifest_path = this_dir + digests.MANIFEST_FILENAME
+	if options.apply is not None:
+		applied_changeset(options.apply, this_dir, manifest_path)
+		return
+	profiler = StageProfiler(
+		enabled = options.profile is not None,
+		cprofile_dir = options.cprofile_dir)
+	# ⌵ With ⟪--replay⟫, the stages up to the replayed one are skipped, their
+	# data being loaded from the checkpoints of a previous run.
+	checkpoints_dir = this_dir + CHECKPOINTS_DIRNAME
+	run = replayed = None
+	replayed_stage = -1
+	if options.replay is not None:
+		replayed = CheckpointRun.replayable(
+			checkpoints_dir, options.replay, options.run)
+		replayed_stage = CHECKPOINT_STAGES.index(options.replay)
 		print(
-			f"Unexpected error upon {step_desc}: {str(sys.exc_info()[0])}")
-		sys.exit()
-	print("Download time: {:.3f} seconds.".format(time.time() - t1))
-	print("Opening the previous Toakao file…")
-	t2 = time.time()
-	idmap = indexed_idmap_from(sorted(
-		table_from_csv_path(idmap_path),
-		key = lambda e: e[0]))
-	save_as_json_file(idmap, this_dir + "id-map.json")
-	old_toakao = object_from_json_path(toakao_path)
-	print("Duration: {:.3f} seconds.".format(time.time() - t2))
-	print("Now unifying the data from these different sources…")
-	official_dict, muakao = reformat_official_dictionary(official_dict)
-	toadua, muakao2 = reformated_toadua(toadua)
-	muakao += muakao2
-	new_toakao = official_dict + toadua
-	clashlist = []
-	new_toakao, nonlemmas = postprocessed(new_toakao, idmap)
-	new_toakao, discarded = competitorless_of(new_toakao)
+			f"Replaying the run ⟪{replayed.run_id}⟫ from its "
+			+ f"⟪{options.replay}⟫ checkpoint…")
+	elif not (
+		options.no_checkpoints or options.dry_run is not None or options.check
+	):
+		# ⌵ Dry runs and checks leave no trace, checkpoints included.
+		run = CheckpointRun.new(checkpoints_dir)
+	toadua_state = previous_toadua_state = None
+	if replayed is None:
+		print("Collecting remote vocabulary sources…")
+		with profiler.stage("download") as stage:
+			official_dict, toadua = downloaded_sources()
+			# The Toadua entries are received here, but decoded while they are
+			# being reformated.
+			stage["entries"] = len(official_dict)
+		if run is not None:
+			run.save_file("official.json", official_dict)
+			toadua = run.recorded("toadua.json", toadua)
+		print("Download time: {:.3f} seconds.".format(time.time() - t1))
+		print("Opening the previous Toakao file…")
+		t2 = time.time()
+		with profiler.stage("id-map load") as stage:
+			# ⌵ Dry runs and checks leave no trace, the index of the ID map
+			# included: it is then rebuilt in memory if it is out of date.
+			idmap = idmap_from_csv_path(
+				idmap_path, idmap_index_path,
+				persist = options.dry_run is None and not options.check)
+			# The entries are held in the compact form of ⟦entry_model⟧.
+			old_toakao = entries_from_dicts(object_from_json_path(toakao_path))
+			stage["entries"] = len(idmap)
+		if run is not None:
+			run.copy_file("toakao.json", toakao_path)
+			run.copy_file("id-map.csv", idmap_path)
+		print("Duration: {:.3f} seconds.".format(time.time() - t2))
+	else:
+		with profiler.stage("id-map load") as stage:
+			idmap = idmap_from_rows(
+				table_from_csv_path(replayed.path_of("id-map.csv")))
+			old_toakao = entries_from_dicts(replayed.load_file("toakao.json"))
+			stage["entries"] = len(idmap)
+	if replayed_stage < 1:
+		print("Now unifying the data from these different sources…")
+		if replayed is not None:
+			official_dict = replayed.load_file("official.json")
+			toadua = json_backend.array_gen_from_path(
+				replayed.path_of("toadua.json"))
+		with profiler.stage("reformat") as stage:
+			official_dict, muakao = reformat_official_dictionary(
+				official_dict, options.workers)
+			if not options.full and replayed is None:
+				toadua_state = previous_toadua_state = toadua_state_from_path(
+					toadua_state_path, toadua_state_inputs_of(this_dir))
+			toadua, muakao2, toadua_state = reformated_toadua_incrementally(
+				toadua, toadua_state, options.workers)
+			if replayed is not None:
+				toadua_state = None
+			muakao += muakao2
+			new_toakao = official_dict + toadua
+			stage["entries"] = len(new_toakao)
+		if run is not None:
+			run.complete(
+				"raw", ["official.json", "toadua.json", "toakao.json", "id-map.csv"])
+			run.save(
+				"reformatted",
+				{"reformatted.json": new_toakao, "muakao.json": muakao})
+	else:
+		muakao = replayed.load_file("muakao.json")
+		if replayed_stage == 1:
+			new_toakao = replayed.load_file("reformatted.json")
+	if replayed_stage < 2:
+		with profiler.stage("postprocess") as stage:
+			new_toakao, nonlemmas = postprocessed(new_toakao, idmap)
+			stage["entries"] = len(new_toakao)
+		if run is not None:
+			run.save(
+				"postprocessed",
+				{"postprocessed.json": new_toakao, "nonlemmas.json": nonlemmas})
+	else:
+		nonlemmas = replayed.load_file("nonlemmas.json")
+		if replayed_stage == 2:
+			new_toakao = replayed.load_file("postprocessed.json")
+	if replayed_stage < 3:
+		with profiler.stage("competitor resolution") as stage:
+			new_toakao, discarded = competitorless_of(new_toakao)
+			discarded = entries_from_dicts(discarded)
+			stage["entries"] = len(new_toakao)
+		if run is not None:
+			run.save(
+				"resolved",
+				{"resolved.json": new_toakao, "discarded.json": discarded})
+	else:
+		discarded = entries_from_dicts(replayed.load_file("discarded.json"))
+		new_toakao = replayed.load_file("resolved.json")
 	#save_as_json_file(new_toakao, this_dir + "TMP.json")
-	old_toakao = sorted_toakao(old_toakao)
-	toakao, deleted, ignored = sync_with(old_toakao, new_toakao)
+	log = EventLog(
+		path = options.log or this_dir + SYNC_LOG_FILENAME,
+		level = options.log_level, console_level = options.verbosity,
+		debug_lemmas = DBG_LEMMAS + options.debug_lemmas)
+	with profiler.stage("sync") as stage:
+		old_toakao = sorted_toakao(old_toakao)
+		toakao, deleted, ignored = sync_with(old_toakao, new_toakao, log)
+		ignored = entries_from_dicts(ignored)
+		stage["entries"] = len(toakao)
+	log.close()
+	log.print_summary()
+	print(f"Synchronization log saved as ⟦{log.path}⟧.")
+	with profiler.stage("synonym computation") as stage:
+		sememe_index = sememe_index_of(toakao)
+		toakao = with_synonyms_from(toakao, sememe_index)
+		stage["entries"] = len(sememe_index)
 	print(f"toakao: {len(toakao)} entries.")
 	print(f"muakao: {len(muakao)} entries.")
 	print(f"nonlemmas: {len(nonlemmas)} entries.")
 	print(f"deleted: {len(deleted)} entries.")
 	print(f"discarded: {len(discarded)} entries.")
 	print(f"ignored: {len(ignored)} entries.")
+	outputs = {
+		toakao_path: toakao,
+		muakao_path: muakao,
+		nonlemmas_path: nonlemmas,
+		deleted_path: deleted,
+		discarded_path: discarded,
+		ignored_path: ignored
+	}
+	if options.dry_run is not None or options.check:
+		# ⌵ Nothing is written but the changeset.
+		changeset = changesets.changeset_from(outputs, log.changeset())
+		for line in changesets.summary_of(changeset):
+			print(line)
+		if options.dry_run is not None:
+			save_as_json_file(changeset, options.dry_run)
+			print(f"Changeset saved as ⟦{options.dry_run}⟧.")
+		report_profile(profiler, options.profile)
+		if options.check and not changesets.is_empty(changeset):
+			sys.exit(1)
+		return
 	# ⌵ Saving files.
 	print("Saving files…")
 	t3 = time.time()
-	save_as_json_file(toakao, toakao_path)
-	save_as_json_file(muakao, muakao_path)
-	save_as_json_file(nonlemmas, nonlemmas_path)
-	save_as_json_file(deleted, deleted_path)
-	save_as_json_file(discarded, discarded_path)
-	save_as_json_file(ignored, ignored_path)
+	with profiler.stage("save") as stage:
+		manifest = digests.manifest_from_path(manifest_path)
+		written = save_as_json_files(outputs, manifest = manifest)
+		# ⌵ A replayed run takes its ID map from the checkpoint, and neither
+		# reads nor writes the index, which may not even exist: its entry of
+		# the manifest is then left as it is.
+		if replayed is None and os.path.isfile(idmap_index_path):
+			digests.record(
+				manifest, idmap_index_path, sha256_of_file(idmap_index_path),
+				{"id-map.csv": sha256_of_file(idmap_path)})
+		digests.save_manifest(manifest, manifest_path)
+		# ⌵ An unchanged state is given back as it is, and need not be saved.
+		if (
+			toadua_state is not None and toadua_state is not previous_toadua_state
+		):
+			toadua_state["inputs"] = toadua_state_inputs_of(this_dir)
+			os.makedirs(os.path.dirname(toadua_state_path), exist_ok = True)
+			# ⌵ The default indentation is the one ⟦orjson⟧ can write.
+			save_as_json_file(toadua_state, toadua_state_path)
+		stage["entries"] = len(written)
+	print(f"{len(written)} files written, the others being unchanged.")
 	print("Duration: {:.3f} seconds.".format(time.time() - t3))
 	print("Total execution time:     {:.3f} seconds.".format(
 		time.time() - t1))
+	report_profile(profiler, options.profile)
 	return
 
-def indexed_idmap_from(idmap):
-	# This function sorts the idmap into submaps for each first letter of Toadua ID, for improving performances when searching a specific ID in it.
-	prev_initial = ""
-	initial = ""
-	l = []
-	indexed = dict()
-	for e in idmap:
-		initial = e[0][0]
-		if prev_initial not in ("", initial):
-			assert prev_initial not in indexed
-			indexed[prev_initial] = l
-			l = []
-		l.append(e)
-		prev_initial = initial
-	if initial != "" and len(l) > 0:
-		indexed[initial] = l
-	return indexed
+def report_profile(profiler, path):
+	if profiler.enabled:
+		profiler.print_summary()
+		profiler.save_report(path)
+		print(f"Profiling report saved as ⟦{path}⟧.")
+
+def applied_changeset(changeset_path, this_dir, manifest_path):
+	# Writes the outputs described by a changeset saved with ⟪--dry-run⟫,
+	# without downloading nor recomputing anything.
+	changeset = object_from_json_path(changeset_path)
+	outputs = changesets.applied_outputs(changeset, this_dir, sorted_toakao)
+	manifest = digests.manifest_from_path(manifest_path)
+	written = save_as_json_files(outputs, manifest = manifest)
+	digests.save_manifest(manifest, manifest_path)
+	print(f"{len(written)} files written from ⟦{changeset_path}⟧.")
+
+def parsed_options(args):
+	parser = argparse.ArgumentParser(
+		prog = "update.py",
+		description = "Synchronizes ⟦toakao.json⟧ with the official dictionary and Toadua.")
+	parser.add_argument(
+		"--full", action = "store_true",
+		help = "reprocess every Toadua entry instead of only the changed ones")
+	parser.add_argument(
+		"--profile", nargs = "?", const = "profile.json", metavar = "REPORT",
+		help = "record time, memory and entry counts for each stage, and save them as a JSON report (default: profile.json)")
+	parser.add_argument(
+		"--cprofile-dir", metavar = "DIR",
+		help = "with --profile, also dump the cProfile statistics of each stage into DIR")
+	parser.add_argument(
+		"--log", metavar = "PATH",
+		help = "where to save the JSON lines log of the synchronization (default: " + SYNC_LOG_FILENAME + ")")
+	parser.add_argument(
+		"--log-level", choices = LEVELS, default = "info",
+		help = "least level of the events saved into the log (default: info)")
+	parser.add_argument(
+		"--verbosity", choices = LEVELS, default = "warning",
+		help = "least level of the events printed on the console (default: warning)")
+	parser.add_argument(
+		"--debug-lemma", dest = "debug_lemmas", action = "append", default = [],
+		metavar = "LEMMA",
+		help = "emit debugging events about the synchronization of LEMMA (repeatable)")
+	modes = parser.add_mutually_exclusive_group()
+	modes.add_argument(
+		"--dry-run", nargs = "?", const = "changeset.json", metavar = "CHANGESET",
+		help = "compute the synchronization without writing any output file, and save the changes as a changeset (default: changeset.json)")
+	modes.add_argument(
+		"--apply", metavar = "CHANGESET",
+		help = "write the outputs described by a changeset saved with --dry-run, offline")
+	parser.add_argument(
+		"--check", action = "store_true",
+		help = "like --dry-run, but exit with status 1 if any output would change")
+	parser.add_argument(
+		"--workers", type = int, default = 1, metavar = "N",
+		help = "number of processes reformatting the entries (default: 1, for serial execution)")
+	parser.add_argument(
+		"--no-checkpoints", action = "store_true",
+		help = "do not save the checkpoints of this run")
+	parser.add_argument(
+		"--replay", choices = CHECKPOINT_STAGES, metavar = "STAGE",
+		help = "rerun the pipeline offline from the checkpoint of STAGE (one of: " + ", ".join(CHECKPOINT_STAGES) + ") of a previous run")
+	parser.add_argument(
+		"--run", metavar = "RUN_ID",
+		help = "with --replay, the run to replay (default: the most recent one having a checkpoint of STAGE)")
+	options = parser.parse_args(args)
+	if options.check and options.apply is not None:
+		parser.error("--check cannot be combined with --apply")
+	return options
+
+def downloaded_sources():
+	# Both dictionaries are independent from each other, so they are downloaded
+	# concurrently; ⟦routines⟧ takes care of the timeouts and retries.
+	downloads = {
+		"the official dictionary":
+			lambda: dicts_from_json_url(OFFICIAL_DICTIONARY_URL),
+		"the Toadua dictionary":
+			lambda: toadua_entries_from_api(TOADUA_SEARCH_ALL_QUERY)
+	}
+	with ThreadPoolExecutor(max_workers = len(downloads)) as executor:
+		futures = {
+			desc: executor.submit(download)
+			for desc, download in downloads.items()
+		}
+		results = []
+		for desc, future in futures.items():
+			try:
+				result = future.result()
+			except:
+				exit_upon_download_error(desc)
+			if not isinstance(result, list):
+				result = guarded_download(desc, result)
+			results.append(result)
+	return tuple(results)
+
+def exit_upon_download_error(desc):
+	print(
+		f"Unexpected error upon attempting to download {desc}: "
+		+ str(sys.exc_info()[0]))
+	sys.exit()
+
+def guarded_download(desc, elements):
+	# The elements of a download which are decoded lazily, the decoding
+	# errors of which are reported as download errors.
+	try:
+		yield from elements
+	except ValueError:
+		exit_upon_download_error(desc)
+
+def toadua_entries_from_api(query):
+	# Iterator over the results of the query. The whole response is first
+	# received into a temporary file (see ⟦http_routines.file_from_post⟧),
+	# from which the results are decoded one at a time; the response is
+	# decoded right away up to its first result, so that a failed query,
+	# which has no ⟪results⟫, raises a ⟦LookupError⟧ here.
+	results = json_backend.array_gen_from_file(
+		http_routines.file_from_post(TOADUA_API_URL, json = query), "results")
+	first = next(results, None)
+	if first is None:
+		return iter(())
+	return chain((first,), results)
+
+def idmap_from_csv_path(csv_path, index_path, persist = True):
+	# The index is stored in a compact JSON form next to the CSV file, along
+	# with the digest of the CSV file it was built from; it is only rebuilt
+	# when that digest changes, and only saved again if ⟦persist⟧.
+	digest = sha256_of_file(csv_path)
+	try:
+		index = object_from_json_path(index_path)
+		if index.get("source_digest") == digest:
+			return index["ids"]
+	except (OSError, ValueError):
+		pass
+	idmap = idmap_from_rows(table_from_csv_path(csv_path))
+	if persist:
+		save_as_json_file(
+			{"source_digest": digest, "ids": idmap}, index_path, indent = None)
+	return idmap
+
+def idmap_from_rows(rows):
+	# Maps each Toadua ID to its [language, lemma, discriminator] row;
+	# should an ID appear more than once, its first row prevails.
+	idmap = dict()
+	for row in rows:
+		if row[0] not in idmap:
+			idmap[row[0]] = row[1:4]
+	return idmap
+
+def tids_by_lemma_from(idmap):
+	# Reverse view of the ID map: each lemma is mapped to its Toadua IDs.
+	tids = dict()
+	for id, (language, lemma, discriminator) in idmap.items():
+		tids.setdefault(lemma, []).append(id)
+	return tids
 
 def sorted_toakao(toakao):
 	return sorted(
@@ -133,34 +425,143 @@ def is_official_author(author):
 
 ### PROCESSING THE OFFICIAL DICTIONARY ###
 
-def reformat_official_dictionary(dictionary):
+def reformat_official_dictionary(dictionary, workers = 1):
 	examples = []
-	for i, e in enumerate(dictionary):
-		dictionary[i] = reformated_entry(dictionary[i])
-		e = dictionary[i]
+	pool = ChunkedPool(reformated_entry, workers, REFORMAT_CHUNK_SIZE)
+	for e in dictionary:
+		pool.submit(e)
+	for i, e in enumerate(pool.results()):
+		dictionary[i] = e
 		if e["examples"] != []:
 			examples.append((e["examples"], e["toaq"]))
 	return (dictionary, examples)
 
 ### PROCESSING THE TOADUA DICTIONARY ###
 
-def reformated_toadua(toadua):
-	print(f"  [Toadua] Initial number of entries: {str(len(toadua))}")
+TOADUA_REQUIRED_FIELDS = frozenset({"id", "head", "scope", "body", "date", "score"})
+
+def reformated_toadua(toadua, workers = 1):
+	# Full refresh: every entry is reformated, and no state is recorded.
+	# The entries are dispatched to ⟦workers⟧ processes (see ⟦ChunkedPool⟧).
+	pool = ChunkedPool(reformated_toadua_entry, workers, REFORMAT_CHUNK_SIZE)
+	total = 0
+	for e in toadua:
+		assert e.keys() >= TOADUA_REQUIRED_FIELDS
+		pool.submit(e)
+		total += 1
+	# ⟦toadua⟧ may be an iterator, only counted once consumed.
+	print(f"  [Toadua] Initial number of entries: {str(total)}")
+	d = [r for r in pool.results() if r is not None]
+	examples = []
+	return (d, examples)
+
+def reformated_toadua_incrementally(toadua, state, workers = 1):
+	# The state records, for each Toadua ID, a fingerprint of the raw entry
+	# (see ⟦toadua_fingerprint_of⟧) along with its reformated version (or
+	# ⟦None⟧ if the entry was excluded); entries whose fingerprint is
+	# unchanged are taken from the state instead of being reformated again.
+	# With a ⟦None⟧ state, every entry is reformated (full refresh); should
+	# no entry have changed, the given state itself is returned.
+	# The entries to reformat are dispatched to ⟦workers⟧ processes (see
+	# ⟦ChunkedPool⟧), their places in the output being kept meanwhile.
+	# The reformated entries are shared by the output and by the new state.
+	if state is not None:
+		previous = state["entries"]
+		refreshed_at = state["refreshed_at"]
+	else:
+		previous = dict()
+		refreshed_at = time.time()
+	entries = dict()
 	d = []
+	pool = ChunkedPool(reformated_toadua_entry, workers, REFORMAT_CHUNK_SIZE)
+	pending = []
 	examples = []
-	for i, e in enumerate(toadua):
-		assert(forall(
-			lambda α: α in e,
-			{"id", "head", "scope", "body", "date", "score"}
-		))
-		if toadua_entry_shall_be_included(e):
-			toadua[i] = reformated_entry(e)
+	counts = {"new": 0, "changed": 0, "unchanged": 0}
+	for e in toadua:
+		assert e.keys() >= TOADUA_REQUIRED_FIELDS
+		id = e["id"]
+		fingerprint = toadua_fingerprint_of(e)
+		known = previous.get(id)
+		if known is not None and known[0] == fingerprint:
+			counts["unchanged"] += 1
+			entries[id] = known
+			if known[1] is not None:
+				d.append(known[1])
 		else:
-			toadua[i] = None
-			# ↑ ‘None’ entries will be removed from ⟦toadua⟧ at a latter step.
-			# Deleting it now would mess with ‘enumerate’.
-	toadua = [e for e in toadua if e is not None]
-	return (toadua, examples)
+			counts["new" if known is None else "changed"] += 1
+			pool.submit(e)
+			pending.append((len(d), id))
+			d.append(None)
+			entries[id] = [fingerprint, None]
+	for (i, id), r in zip(pending, pool.results()):
+		d[i] = entries[id][1] = r
+	d = [r for r in d if r is not None]
+	# ⟦toadua⟧ may be an iterator, only counted once consumed.
+	total = counts["new"] + counts["changed"] + counts["unchanged"]
+	print(f"  [Toadua] Initial number of entries: {str(total)}")
+	if state is not None:
+		removed_count = sum(1 for id in previous if id not in entries)
+		print(
+			f"  [Toadua] Incremental update: {counts['new']} new, "
+			+ f"{counts['changed']} changed, {removed_count} removed, "
+			+ f"{counts['unchanged']} unchanged entries.")
+		if counts["unchanged"] == total and removed_count == 0:
+			return (d, examples, state)
+	state = {
+		"version": TOADUA_STATE_VERSION,
+		"refreshed_at": refreshed_at,
+		"entries": entries
+	}
+	return (d, examples, state)
+
+def reformated_toadua_entry(entry):
+	# The reformated entry, or ⟦None⟧ if the entry is excluded.
+	if toadua_entry_shall_be_included(entry):
+		return reformated_entry(entry)
+	return None
+
+def toadua_fingerprint_of(entry):
+	# The fields which change whenever an entry is edited: an edit of its
+	# head or body is assumed to renew its date, and a new note changes the
+	# number of notes and the date of the last one. The ID is the key of the
+	# fingerprint in the state. Changes which these would miss, such as a
+	# note edited in place, are caught up by the periodic full refresh (see
+	# ⟦TOADUA_FULL_REFRESH_INTERVAL⟧).
+	notes = entry.get("notes", [])
+	return [
+		entry["date"], entry["score"], len(notes),
+		notes[-1].get("date") if len(notes) > 0 else None
+	]
+
+def toadua_state_inputs_of(this_dir):
+	# The digests of the files of ⟦TOADUA_STATE_INPUTS⟧.
+	return {
+		name: sha256_of_file(os.path.join(this_dir, *name.split("/")))
+		for name in TOADUA_STATE_INPUTS}
+
+def toadua_state_from_path(path, inputs):
+	# Returns ⟦None⟧ whenever a full refresh is needed.
+	# The state is made of many small containers, none of which is part of a
+	# reference cycle; the cyclic garbage collector, which would otherwise
+	# keep scanning them while they are decoded, is paused meanwhile.
+	gc_was_enabled = gc.isenabled()
+	gc.disable()
+	try:
+		state = object_from_json_path(path)
+	except (OSError, ValueError):
+		return None
+	finally:
+		if gc_was_enabled:
+			gc.enable()
+	if state.get("version") != TOADUA_STATE_VERSION:
+		return None
+	if state.get("inputs") != inputs:
+		print("  [Toadua] The reformating code has changed, refreshing fully.")
+		return None
+	if time.time() - state["refreshed_at"] > TOADUA_FULL_REFRESH_INTERVAL:
+		print("  [Toadua] The incremental state is too old, refreshing fully.")
+		return None
+	return state
 
 def toadua_entry_shall_be_included(entry):
 	return (
@@ -243,10 +644,8 @@ def reformated_entry(entry):
 						# ⟦definition_type⟧ remains set to "informal".
 	assert(len(definition) > 0)
 	is_a_lemma = (
-		pytoaq.is_a_lemma(toaq_item) or pytoaq.is_a_lemma(
-			with_replaced_chars(
-				toaq_item, "áéíóúâêîôûäëïöü", "aeıouaeıouaeıou")
-		)
+		toaq_text.is_a_lemma(toaq_item)
+		or toaq_text.is_a_lemma(toaq_text.without_tones(toaq_item))
 	)
 	r = {
 		"toaq":             toaq_item,
@@ -280,23 +679,50 @@ def reformated_entry(entry):
 		r["discriminator"] = "1"
 	return with_toadua_note_fields(r, comments)
 
+# The fields of the reformated entries (see ⟦reformated_entry⟧) which
+# Toadua notes such as ⟪type: illocution⟫ may assign.
+NOTE_FIELDS = (
+	"discriminator", "is_a_lemma", "officialized", "type", "frame",
+	"distribution", "pronominal_class", "subject", "examples", "etymology",
+	"etymological_notes", "sememe", "definition_type", "translations"
+)
+# A field may be named as such or capitalized, optionally followed by ⟪s⟫.
+NOTE_FIELD_TABLE = {
+	name + s: k
+	for k in NOTE_FIELDS for name in (k, k.capitalize()) for s in ("", "s")
+}
+NOTE_FIELD_PATTERN = re.compile(r"([A-Za-z_]+):")
+# Notes giving a single example each.
+EXAMPLE_NOTE_NAMES = ("example", "Example")
+
 def with_toadua_note_fields(entry, notes):
 	# We will walk the notes from the most recent one to the most ancient one,
 	# looking for field-value expressions such as ⟪type: illocution⟫,
 	# and for each field we will at most pick a single assignment, namely
-	# the most recent one.
-	notes = reversed(notes)
-	ks = [k for k in entry.keys() if k not in [
-		"toaq", "is_official", "synonyms"]]
-	for note in notes:
-		for k in ks:
-			t = note["content"]
-			if t.startswith(k) or t.startswith(k.capitalize()):
-				t = t[len(k):]
-				if t.startswith(":") or t.startswith("s:"):
-					entry[k] = t[t.index(":")+1:].strip()
-					ks.remove(k)
-					# TODO: Handle multiple notes each starting with ⟪example:⟫.
+	# the most recent one; the walk stops once every field is assigned.
+	# The ⟪example:⟫ notes are collected, in chronological order, as the
+	# examples of the entry, unless an ⟪examples:⟫ note assigns them; they
+	# take the shape of the examples of the official dictionary, with an
+	# empty translation, which the notes do not tell apart.
+	assigned = set()
+	examples = []
+	for note in reversed(notes):
+		t = note["content"]
+		m = NOTE_FIELD_PATTERN.match(t)
+		if m is None:
+			continue
+		name = m.group(1)
+		k = NOTE_FIELD_TABLE.get(name)
+		if k is not None:
+			if k not in assigned:
+				entry[k] = t[m.end():].strip()
+				assigned.add(k)
+				if len(assigned) == len(NOTE_FIELDS):
+					break
+		elif name in EXAMPLE_NOTE_NAMES:
+			examples.append({"toaq": t[m.end():].strip(), "english": ""})
+	if examples != [] and "examples" not in assigned:
+		entry["examples"] = examples[::-1]
 	if isinstance(entry["officialized"], str):
 		entry["officialized"] = (
 			entry["officialized"] in ("True", "true", "Yes", "yes"))
@@ -307,129 +733,141 @@ def with_toadua_note_fields(entry, notes):
 
 # ==================================================================== #
 
+POSTPROCESSING_ROUTES = ("kept", "nonlemma", "officialized")
+
 def postprocessed(toakao, idmap):
-	nonlemmas = []
-	i = 0
-	while i < len(toakao):
-		if toakao[i]["officialized"] == True:
-			toakao.pop(i)
-			continue
-		if not toakao[i]["is_a_lemma"]:
-			nonlemmas.append(toakao.pop(i))
-			continue
-		for k in ["is_a_lemma", "officialized"]:
-			if k in toakao[i]:
-				toakao[i].pop(k)
-		if not "langdata" in toakao[i]:
-			toakao[i]["langdata"] = dict()
-		for translation in toakao[i]["translations"]:
-			lang = translation["language"]
-			toakao[i][lang + "_definition"] = translation["definition"]
-			toakao[i][lang + "_notes"] = translation["notes"]
-			toakao[i][lang + "_gloss"] = translation["gloss"]
-			toakao[i]["langdata"][lang] = {
-				"id": translation["id"],
-				"author": translation["author"],
-				"date": translation["date"],
-				"score": translation["score"]
-			}
-		toakao[i].pop("translations")
-		toakao[i] = {
-			key if key != 'toaq' else 'lemma': value
-			for key, value in toakao[i].items()
-		} # renaming the key ⟪toaq⟫ to ⟪lemma⟫
-		if toakao[i]["discriminator"] == "":
-			toakao[i]["discriminator"] = discriminator_from_tid_of(
-				toakao[i], idmap)
-		i += 1
-	toakao = sorted_toakao_2(toakao)
-	return (toakao, nonlemmas)
+	outputs = postprocessing_outputs(toakao, idmap)
+	return (sorted_toakao_2(outputs["kept"]), outputs["nonlemma"])
+
+def postprocessing_outputs(entries, idmap):
+	# Collects the output of ⟦routed_entries⟧ into one list per route.
+	outputs = {route: [] for route in POSTPROCESSING_ROUTES}
+	for route, e in routed_entries(entries, idmap):
+		outputs[route].append(e)
+	return outputs
+
+def routed_entries(entries, idmap):
+	# Yields a (route, entry) pair for each of the unified entries, in a
+	# single pass: officialized Toadua entries are routed apart, as they are
+	# superseded by the official dictionary; non-lemma entries are routed
+	# unchanged to the nonlemmas; the other entries are kept, converted into
+	# the Toakao format (see ⟦FORMAT.md⟧).
+	for e in entries:
+		if e["officialized"] == True:
+			yield ("officialized", e)
+		elif not e["is_a_lemma"]:
+			yield ("nonlemma", e)
+		else:
+			yield ("kept", toakao_entry_from(e, idmap))
+
+def toakao_entry_from(entry, idmap):
+	# The key ⟪toaq⟫ is renamed ⟪lemma⟫ while keeping its position, and the
+	# translations are flattened into ⟪langdata⟫ and the ⟪<lang>_…⟫ fields.
+	r = dict()
+	for k, v in entry.items():
+		if k == "toaq":
+			r["lemma"] = v
+		elif k not in ("is_a_lemma", "officialized", "translations"):
+			r[k] = v
+	langdata = r.setdefault("langdata", dict())
+	for translation in entry["translations"]:
+		lang = translation["language"]
+		r[lang + "_definition"] = translation["definition"]
+		r[lang + "_notes"] = translation["notes"]
+		r[lang + "_gloss"] = translation["gloss"]
+		langdata[lang] = {
+			"id": translation["id"],
+			"author": translation["author"],
+			"date": translation["date"],
+			"score": translation["score"]
+		}
+	if r["discriminator"] == "":
+		r["discriminator"] = discriminator_from_tid_of(r, idmap)
+	return r
 
 def discriminator_from_tid_of(entry, idmap):
-	tids = all_tids_of(entry)
-	for selected_id in tids:
-		if selected_id[0] in idmap:
-			for e in idmap[selected_id[0]]:
-				if e[0] == selected_id:
-					assert e[2] == entry["lemma"]
-					return e[3]
+	for selected_id in all_tids_of(entry):
+		if selected_id in idmap:
+			language, lemma, discriminator = idmap[selected_id]
+			assert lemma == entry["lemma"]
+			return discriminator
 	return ""
 
 # ==================================================================== #
 
 DATE_TEMPLATE = '%Y-%m-%dT%H:%M:%S.%fZ'
 
+@lru_cache(maxsize = 1 << 16)
 def timestamp_from_date_text(date_text):
 	try:
 		return datetime.strptime(date_text, DATE_TEMPLATE).timestamp()
 	except:
 		return 0
 
-WINNER_SELECTION_FUNCTIONS = [
-	lambda _: 1 if _.get("author", "") == "official" else 0,
-#	lambda _: 1 if is_official_author(_.get("author", "")) else 0,
-	lambda _: _["score"] if "score" in _ else 0,
-	lambda _: -timestamp_from_date_text(_.get("date", None))
-]
+def rank_of(langdata):
+	# Ranking of a translation (given its ⟪langdata⟫ item) among its
+	# competitors; the greatest rank wins. The criteria are, by order of
+	# precedence: official authorship, the greatest score, the earliest date.
+	return (
+		1 if langdata.get("author", "") == "official" else 0,
+		# 1 if is_official_author(langdata.get("author", "")) else 0,
+		langdata["score"] if "score" in langdata else 0,
+		-timestamp_from_date_text(langdata.get("date", None))
+	)
 
 def wins_over(e, ε):
-	for f in WINNER_SELECTION_FUNCTIONS:
-		winner = the_most(e, ε, f)
-		if winner == e:
-			return True
-		elif winner == ε:
-			return False
-		else:
-			continue
-	return False
+	return rank_of(e) > rank_of(ε)
 
-def the_most(α, β, f):
-	if f(α) > f(β):
-		return α
-	elif f(α) < f(β):
-		return β
-	else:
-		return None
+def competition_key_of(e):
+	return (e["lemma"], e["discriminator"], all_langs_of(e)[0])
 
 def competitorless_of(toakao):
 	# We assume the data is already sorted according to the following hierarchy:
 	#    lemma > discriminator > language
+	# For each (lemma, discriminator, language) group, the translation of
+	# greatest rank is kept (the first one in case of a tie); the others are
+	# discarded, in the order in which a pairwise elimination from left to
+	# right would discard them.
+	kept = []
 	discarded = []
-	prev_item = ""
-	i = 0
-	while i < len(toakao):
-		lang = all_langs_of(toakao[i])[0]
-		item = toakao[i]["lemma"]
-		item += "#" + toakao[i]["discriminator"]
-		item += "-" + lang
-		if i != 0 and item == prev_item:
-			if wins_over(
-				toakao[i]["langdata"][lang],
-				toakao[i - 1]["langdata"][lang]
-			):
-				discarded.append(toakao[i - 1])
+	for (_, _, lang), group in groupby(toakao, key = competition_key_of):
+		champion = next(group)
+		champion_rank = rank_of(champion["langdata"][lang])
+		for e in group:
+			rank = rank_of(e["langdata"][lang])
+			if rank > champion_rank:
+				discarded.append(champion)
+				champion, champion_rank = e, rank
 			else:
-				discarded.append(toakao[i])
-				toakao[i] = toakao[i - 1]
-			toakao[i - 1] = None
-		prev_item = item
-		i += 1
-	return [e for e in toakao if not e is None], discarded
+				discarded.append(e)
+		kept.append(champion)
+	return kept, discarded
 
 # ==================================================================== #
 
+# Lemmas for which the synchronization emits debugging events, in addition
+# to those given with ⟪--debug-lemma⟫.
 DBG_LEMMAS = []
 
-def sync_with(old, new):
+def sync_with(old, new, log = None):
 	# We assume that both are already sorted alphabetically.
+	# The synchronization events are recorded into ⟦log⟧ (see ⟦sync_log.py⟧).
+	if log is None:
+		log = EventLog(debug_lemmas = DBG_LEMMAS)
+	debug_lemmas = log.debug_lemmas
 	added = []
+	added_index = dict()
+	# ↑ Position in ⟦added⟧ of the first entry of each (lemma, discriminator).
 	deleted = []
 	ignored = []
 	oi = 0
 	ni = 0
 	prev_oi = -1
 	waitlist_lemma = ""
-	waitlist = []
+	waitlist = dict()
+	# ↑ The best new entry so far for each (lemma, discriminator, language)
+	# of the undiscriminated translations which could not be matched yet;
+	# the others are ignored as soon as they lose.
 	oi_has_synced = False
 	while oi < len(old) and ni < len(new):
 		assert len(new[ni]["langdata"]) == 1
@@ -437,20 +875,23 @@ def sync_with(old, new):
 		new_lemma = new[ni]["lemma"]
 		od = old[oi]["discriminator"]
 		nd = new[ni]["discriminator"]
-		if new_lemma in DBG_LEMMAS or old_lemma in DBG_LEMMAS:
-			s = "⊤" if prev_oi == oi else "⊥"
-			print(f"● @{oi} {old_lemma}#{od} {s} : @{ni} {new_lemma}#{nd}")
-			print(f"   {all_tids_of(old[oi])} : {sole_tid_of(new[ni])}")
+		if debug_lemmas and log.debugs(old_lemma, new_lemma):
+			log.debug(
+				"step", old_index = oi, old_lemma = old_lemma,
+				old_discriminator = od, same_old = prev_oi == oi,
+				new_index = ni, new_lemma = new_lemma, new_discriminator = nd,
+				old_ids = all_tids_of(old[oi]), new_id = sole_tid_of(new[ni]))
 		if waitlist_lemma not in ("", old_lemma):
 			# Purging the remnants of the waitlist.
-			for e in waitlist:
+			for e in waitlist.values():
 				lang = list(e["langdata"].keys())[0]
-				definition = e[lang + "_definition"]
-				dis = e["discriminator"]
-				print(f"⚠ IGNORING NEW COMPETITOR WITHOUT DISCRIMINATOR:")
-				print(f"  {e['lemma']}#{dis} @{lang} #{list(e['langdata'].values())[0]}: ⟪{definition}⟫")
+				log.warning(
+					"ignored-competitor", lemma = e["lemma"],
+					discriminator = e["discriminator"], language = lang,
+					id = e["langdata"][lang]["id"],
+					definition = e[lang + "_definition"])
 				ignored.append(e)
-			waitlist = []
+			waitlist = dict()
 		waitlist_lemma = old_lemma
 		if prev_oi != oi:
 			oi_has_synced = False
@@ -459,32 +900,36 @@ def sync_with(old, new):
 			# ⟦new[ni]⟧ is a new lemma, absent from ⟦old⟧.
 			if new[ni]["discriminator"] == "":
 				new[ni]["discriminator"] = "1"
-			is_found = False
-			for i, e in enumerate(added):
-				if e["lemma"] == new_lemma:
-					if e["discriminator"] == new[ni]["discriminator"]:
-						added[i] = sync_fields_with(e, new[ni])
-						is_found = True
-						break
 			dis = new[ni]["discriminator"]
-			if not is_found:
-				print(f'𖣔 N-ADD: {new[ni]["lemma"]}#{dis} @{list(new[ni]["langdata"].keys())[0]}')
-				added.append(new[ni])
+			i = added_index.get((new_lemma, dis))
+			if i is not None:
+				added[i] = sync_fields_with(added[i], new[ni], log)
+				log.info(
+					"added-synced", lemma = new_lemma, discriminator = dis,
+					language = list(new[ni]["langdata"].keys())[0])
 			else:
-				print(f'𖣔 N-ADD-SYNC: {new[ni]["lemma"]}#{dis} @{list(new[ni]["langdata"].keys())[0]}')
+				added_index[(new_lemma, dis)] = len(added)
+				log.info(
+					"added", lemma = new_lemma, discriminator = dis,
+					language = list(new[ni]["langdata"].keys())[0])
+				log.record_addition(new_lemma, dis)
+				added.append(new[ni])
 			ni += 1
 		elif old_lemma < new_lemma:
 			if not oi_has_synced:
-				if waitlist != [] and old[oi]["discriminator"] == "1":
+				if waitlist and old[oi]["discriminator"] == "1":
 					assert waitlist_lemma == old[oi]["lemma"]
-					for e in waitlist:
-						old[oi] = sync_fields_with(old[oi], e)
-						dis = e["discriminator"]
-						print(f'𖣔 WL-SYNC-1ₐ: {e["lemma"]}#{dis} @{list(e["langdata"].keys())[0]}')
+					for e in waitlist.values():
+						old[oi] = sync_fields_with(old[oi], e, log)
+						log.info(
+							"waitlist-synced", lemma = e["lemma"],
+							discriminator = e["discriminator"],
+							language = list(e["langdata"].keys())[0])
 					oi_has_synced = True
 				else:
 					# ⟦old[oi]⟧ has been deleted in ⟦new⟧, it must likewise be deleted in ⟦old⟧.
-					print(f"𖣔 O-DEL: {old_lemma}#{od}")
+					log.info("deleted", lemma = old_lemma, discriminator = od)
+					log.record_removal(old_lemma, od)
 					deleted.append(old[oi])
 					old[oi] = None
 			oi += 1
@@ -515,44 +960,67 @@ def sync_with(old, new):
 				)
 				if nid in otids or is_presumed_monosemic_translation:
 					if is_presumed_monosemic_translation:
-						print(f"⚠ It is assumed that the following translation doesn't represent a new polyseme:")
-					if old_lemma in DBG_LEMMAS:
-						print(f"𖣔 N-SYNC-∅: {old_lemma} @{lang}: ⟪{definition}⟫")
-						print(f"  ➤ {new[ni]}")
-					old[oi] = sync_fields_with(old[oi], new[ni])
+						# The translation is assumed not to represent a new
+						# polyseme.
+						log.warning(
+							"presumed-monosemic", lemma = old_lemma,
+							language = lang, id = nid, definition = definition)
+					if debug_lemmas and log.debugs(old_lemma):
+						log.debug(
+							"synced-undiscriminated", lemma = old_lemma,
+							language = lang, definition = definition,
+							entry = copy.deepcopy(new[ni]))
+					old[oi] = sync_fields_with(old[oi], new[ni], log)
 					oi_has_synced = True
 				else:
-					if old_lemma in DBG_LEMMAS:
-						print(f"𖣔 WL {old_lemma} @{lang} #{nid}: ⟪{definition}⟫")
-						print(f"    ¬∈ {otids}")
-						print(f"  ➤ {new[ni]}")
-					waitlist.append(new[ni])
-					waitlist, ds = competitorless_of(waitlist)
-					ignored += ds
+					if debug_lemmas and log.debugs(old_lemma):
+						log.debug(
+							"waitlisted", lemma = old_lemma, language = lang,
+							id = nid, old_ids = otids, definition = definition,
+							entry = copy.deepcopy(new[ni]))
+					key = (old_lemma, nd, lang)
+					champion = waitlist.get(key)
+					if champion is None:
+						waitlist[key] = new[ni]
+					elif wins_over(
+						new[ni]["langdata"][lang], champion["langdata"][lang]
+					):
+						ignored.append(champion)
+						waitlist[key] = new[ni]
+					else:
+						ignored.append(new[ni])
 				ni += 1
 				if ni < len(new) and new[ni]["lemma"] != old_lemma:
 					oi += 1
 			elif od > nd:
-				print(f'⚠ NEW POLYSEME: {lemma}#{nd}')
+				log.warning("new-polyseme", lemma = lemma, discriminator = nd)
+				log.record_addition(lemma, nd)
+				added_index.setdefault((lemma, nd), len(added))
 				added.append(new[ni])
 				ni += 1
 			elif od < nd:
 				if not oi_has_synced:
-					if waitlist != [] and old[oi]["discriminator"] == "1":
+					if waitlist and old[oi]["discriminator"] == "1":
 						assert waitlist_lemma == old[oi]["lemma"]
-						for e in waitlist:
-							old[oi] = sync_fields_with(old[oi], e)
-							dis = e["discriminator"]
-							print(f'𖣔 WL-SYNC-1ᵦ: {e["lemma"]}#{dis} @{list(e["langdata"].keys())[0]}')
+						for e in waitlist.values():
+							old[oi] = sync_fields_with(old[oi], e, log)
+							log.info(
+								"waitlist-synced", lemma = e["lemma"],
+								discriminator = e["discriminator"],
+								language = list(e["langdata"].keys())[0])
 						oi_has_synced = True
 					else:
-						print(f"𖣔 O-DEL₂ {old_lemma}#{od}")
+						log.info("deleted", lemma = old_lemma, discriminator = od)
+						log.record_removal(old_lemma, od)
 						deleted.append(old[oi])
 						old[oi] = None
 				oi += 1
 			elif od == nd:
-				if old_lemma in DBG_LEMMAS:
-					print(f"𖣔 N-SYNC-D {old_lemma}#{od} @{lang} #{nid}: ⟪{definition}⟫")
+				if debug_lemmas and log.debugs(old_lemma):
+					log.debug(
+						"synced-discriminated", lemma = old_lemma,
+						discriminator = od, language = lang, id = nid,
+						definition = definition)
 				if not lang in list(old[oi]["langdata"].keys()):
 					# Translation in a new language.
 					old[oi]["langdata"][lang] = new[ni]["langdata"][lang]
@@ -561,13 +1029,11 @@ def sync_with(old, new):
 							for s in ("_definition", "_notes", "_gloss")])
 					for s in ("_definition", "_notes", "_gloss"):
 						old[oi][lang + s] = new[ni][lang + s]
-				old[oi] = sync_fields_with(old[oi], new[ni])
+				old[oi] = sync_fields_with(old[oi], new[ni], log)
 				oi_has_synced = True
 				ni += 1
 				if ni < len(new) and new[ni]["lemma"] != old_lemma:
 					oi += 1
-	print(f"❖ ADDED ×{len(added)}: {[e['lemma'] for e in added]}")
-	print(f"❖ REMOVED × {len(deleted)}: {[e['lemma'] for e in deleted]}")
 	old = [e for e in old if e != None]
 	old += added
 	old = sorted_toakao(old)
@@ -575,29 +1041,40 @@ def sync_with(old, new):
 	prev_lemma = ""
 	prev_discriminator = ""
 	for i, e in enumerate(old):
-		old[i]["synonyms"] = []
-		if e["sememe"] != "":
-			for i2, e2 in enumerate(old):
-				if equals(e, e2, lambda x: x["sememe"]):
-					if not equals(e, e2, lambda x: x["lemma"]):
-						#print(
-						#	f"🙨 SYNONYMS: {e['lemma']}#{e['discriminator']}"
-						#	+ f" : {e2['lemma']}#{e2['discriminator']}")
-						if not old[i]["lemma"] in old[i2]["synonyms"]:
-							old[i2]["synonyms"].append(old[i]["lemma"])
-						if not old[i2]["lemma"] in old[i]["synonyms"] != "":
-							old[i]["synonyms"].append(old[i2]["lemma"])
 		for lang in all_langs_of(e):
 			for k in [lang + suffix for suffix in ["_notes", "_gloss"]]:
 				if not k in e:
 					e[k] = ""
 		if e["lemma"] == prev_lemma:
 			if e["discriminator"] == prev_discriminator:
-				print(f"🤂🤂🤂 DISCRIMINATOR-DUPLICATE: {prev_lemma}#{prev_discriminator}")
+				log.error(
+					"discriminator-duplicate", lemma = prev_lemma,
+					discriminator = prev_discriminator)
 		prev_lemma = e["lemma"]
 		prev_discriminator = e["discriminator"]
 	return (old, deleted, ignored)
 
+def sememe_index_of(toakao):
+	# Maps each nonempty sememe to the list of entries bearing it, in the order
+	# of ⟦toakao⟧; each such list is a synonym group.
+	index = dict()
+	for e in toakao:
+		if e["sememe"] != "":
+			index.setdefault(e["sememe"], []).append(e)
+	return index
+
+def with_synonyms_from(toakao, sememe_index):
+	# The synonyms of an entry are the lemmas of its synonym group, minus its
+	# own lemma, without repetitions.
+	for e in toakao:
+		e["synonyms"] = []
+	for group in sememe_index.values():
+		lemmas = list(dict.fromkeys(e["lemma"] for e in group))
+		if len(lemmas) > 1:
+			for e in group:
+				e["synonyms"] = [l for l in lemmas if l != e["lemma"]]
+	return toakao
+
 def sole_tid_of(e):
 	l = all_tids_of(e)
 	assert len(l) == 1
@@ -617,7 +1094,7 @@ PROTECTED_FIELDS = (
 	"lemma", "discriminator"
 )
 
-def sync_fields_with(old, new):
+def sync_fields_with(old, new, log):
 	for lang in new["langdata"]:
 		old["langdata"][lang] = new["langdata"][lang]
 		assert lang + "_definition" in new
@@ -625,22 +1102,30 @@ def sync_fields_with(old, new):
 		if not k in IGNORED_FIELDS:
 			if new[k] not in ("", [], dict()):
 				if k in old and old[k] != new[k]:
-					print(
-						f"❖ {old['lemma']}#{old['discriminator']}.{k}: "
-						+ f"new ⟪{new[k]}⟫ ≠ old ⟪{old[k]}⟫."
-					)
+					log.info(
+						"field-changed", lemma = old["lemma"],
+						discriminator = old["discriminator"], field = k,
+						old = old[k], new = new[k])
+					if not k in PROTECTED_FIELDS:
+						log.record_change(
+							old["lemma"], old["discriminator"], k, old[k], new[k])
 				elif not k in old:
-					print(
-						f"❖ {old['lemma']}#{old['discriminator']}.{k}: "
-						+ f"new ⟪{new[k]}⟫."
-					)
+					log.info(
+						"field-added", lemma = old["lemma"],
+						discriminator = old["discriminator"], field = k,
+						new = new[k])
+					if not k in PROTECTED_FIELDS:
+						log.record_change(
+							old["lemma"], old["discriminator"], k, None, new[k])
 				if not k in PROTECTED_FIELDS:
 					old[k] = new[k]
 	for lang in all_langs_of(old):
 		if not lang in old["langdata"]:
-			print(f"⚠⚠⚠ {old['lemma']}#{old['discriminator']} MISSING {lang} IN LANGDATA!")
-			print(str(list(new["langdata"].keys())))
-			print(str(all_langs_of(new)))
+			log.error(
+				"missing-langdata", lemma = old["lemma"],
+				discriminator = old["discriminator"], language = lang,
+				new_languages = list(new["langdata"].keys()),
+				new_definition_languages = all_langs_of(new))
 	return old
 
 # ==================================================================== #
@@ -653,18 +1138,10 @@ def forall(property, iterable):
 def equals(α, β, f):
 	return f(α) == f(β)
 
-def with_replaced_chars(s, srclist, dstlist):
-	r = ""
-	for c in s:
-		for i, sc in enumerate(srclist):
-			if c == sc:
-				c = dstlist[i]
-		r += c
-	return r
-
 # ==================================================================== #
 
 # === ENTRY POINT === #
 
-entrypoint(*sys.argv)
+if __name__ == "__main__":
+	entrypoint(*sys.argv)
 
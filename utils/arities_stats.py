@@ -5,18 +5,11 @@
 import sys, os, json, time
 from collections import OrderedDict, Counter as multiset
 
-def import_from_path(name, path):
-  import importlib.util
-  spec = importlib.util.spec_from_file_location(name, path)
-  mod = importlib.util.module_from_spec(spec)
-  spec.loader.exec_module(mod)
-  return mod
-
-routines = import_from_path("routines", "../routines.py")
+from common import dicts_gen_from_json_path
 
 def entrypoint(this_path, json_path):
   t1 = time.time()
-  f(routines.dicts_from_json_path(json_path))
+  f(dicts_gen_from_json_path(json_path))
   print("Total execution time: {:.3f} seconds.".format(
         time.time() - t1))
 
@@ -2,41 +2,55 @@
 
 # SPDX-License-Identifier: ISC
 
-import os, io, csv, json
-import requests
-from collections import OrderedDict
+import os, io, csv
+
+def _import_from_path(name, path):
+  import importlib.util
+  spec = importlib.util.spec_from_file_location(name, path)
+  mod = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(mod)
+  return mod
+
+_TOP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+http_routines = _import_from_path(
+  "http_routines", os.path.join(_TOP_DIR, "http_routines.py"))
+json_backend = _import_from_path(
+  "json_backend", os.path.join(_TOP_DIR, "json_backend.py"))
+digests = _import_from_path(
+  "digests", os.path.join(_TOP_DIR, "digests.py"))
+entry_model = _import_from_path(
+  "entry_model", os.path.join(_TOP_DIR, "entry_model.py"))
+
+MANIFEST_PATH = os.path.join(_TOP_DIR, digests.MANIFEST_FILENAME)
 
 def edit_json_from_path(input_path, function, output_path = None):
   if output_path == None:
     output_path = (lambda t: t[0] + "-out" + t[1])(
       os.path.splitext(input_path)
     )
-  if input_path == output_path:
-    inputf = outputf = open(output_path, "rb+")
-    input = inputf.read().decode('utf-8')
-  else:
-    inputf = open(input_path,  "r", encoding = "utf8")
-    outputf = open(output_path, "wb")
-    input = inputf.read()
-  obj = json.loads(input, object_pairs_hook = OrderedDict)
-  if outputf == inputf:
-    outputf.seek(0)
-  outputf.truncate()
-  outputf.write(
-    bytes(
-      json.dumps(function(obj), indent = 2, ensure_ascii = False),
-      encoding = "utf8"
-    )
-  )
-  inputf.close()
-  outputf.close()
+  obj = json_backend.load_path(input_path)
+  save_as_json_file(function(obj), output_path)
 
 def object_from_json_path(path):
-  with open(path, "r", encoding = "utf-8") as f:
-    return json.loads(f.read(), object_pairs_hook = OrderedDict)
+  return json_backend.load_path(path)
 
 dicts_from_json_path = object_from_json_path
 
+def entries_from_json_path(path):
+  # The Toakao entries of the file, as ⟦entry_model.Entry⟧ objects.
+  return entry_model.entries_from_dicts(json_backend.load_path(path))
+
+# The ⟦…_gen_from_…⟧ functions yield the elements of a top-level JSON array
+# one at a time, or those of the array under ⟦key⟧ in a top-level object.
+
+def dicts_gen_from_json_path(path, key = None):
+  return json_backend.array_gen_from_path(path, key)
+
+def entries_gen_from_json_path(path):
+  for d in json_backend.array_gen_from_path(path):
+    yield entry_model.Entry.from_dict(d)
+
 def table_from_csv_path(path, delimiter = ','):
   with open(path, "r", encoding = "utf-8") as f:
     r = csv.reader(f, delimiter = delimiter)
@@ -50,19 +64,26 @@ def table_gen_from_csv_path(path, delimiter = ','):
     return csv.reader(f, delimiter = delimiter)
 
 def _content_from_url(url):
-  response = requests.get(url)
-  response.raise_for_status()
-  assert response.status_code == 200, (
-    'Wrong status code :' + str(response.status_code))
-  return response.content
+  # Responses are cached on disk and revalidated with conditional requests;
+  # see ⟦http_routines.py⟧.
+  return http_routines.content_from_url(url)
 
 def object_from_json_url(url):
-  return json.loads(_content_from_url(url))
+  return json_backend.loads(_content_from_url(url))
 
 dicts_from_json_url = object_from_json_url
 
+def dicts_gen_from_json_url(url, key = None):
+  return json_backend.array_gen_from_chunks(
+    http_routines.chunks_from_url(url), key)
+
+def content_from_url(url):
+  return _content_from_url(url)
+
 def table_from_csv_url(url, delimiter = ','):
-  content = _content_from_url(url)
+  return table_from_csv_content(_content_from_url(url), delimiter)
+
+def table_from_csv_content(content, delimiter = ','):
   content = io.StringIO(content.decode("UTF8"), newline = None)
   csv_reader = csv.reader(content, delimiter = delimiter)
   table = []
@@ -106,19 +127,24 @@ def save_dicts_as_csv_file(dicts, path, delimiter = ','):
     table.insert(0, keys)
     csv.writer(o, delimiter = delimiter).writerows(table)
 
+def save_dict_gen_as_csv_file(dicts, keys, path, delimiter = ','):
+  # Same as ⟦save_dicts_as_csv_file⟧ for dicts whose keys are known in
+  # advance, written one at a time.
+  with open(path, "w", newline='', encoding='utf-8') as o:
+    w = csv.writer(o, delimiter = delimiter)
+    w.writerow(keys)
+    w.writerows([d.get(k) for k in keys] for d in dicts)
+
 def save_as_json_file(dicts, path, indent = 2):
+  # ⟦dicts⟧ may be a generator, whose elements are then written one at a time.
   with open(path, "wb") as o:
-    o.truncate()
-    o.write(bytes(
-      json.dumps(dicts, indent = indent, ensure_ascii = False),
-      encoding = "utf8"
-    ))
+    json_backend.dump(dicts, o, indent)
 
 def keys_and_table_from_dict(dicts):
   keys = []
   table = []
   for d in dicts:
-    assert isinstance(d, (dict, OrderedDict)), (
+    assert isinstance(d, dict), (
       f"keys_and_table_from_dict(): Wrong element type: {type(d)}")
     for k in d.keys():
       if k not in keys:
@@ -140,7 +166,7 @@ def dict_from_key_value(dictionaries, key, value):
   for d in dictionaries:
     if isinstance(d, (list, tuple, set, frozenset)):
       d = dict(d)
-    if isinstance(d, (dict, OrderedDict)) and key in d:
+    if isinstance(d, dict) and key in d:
       if d[key] == value:
         return d
   return None
@@ -152,7 +178,7 @@ def dict_index_from_key_value(dictionaries, key, value):
     d = dictionaries[i]
     if isinstance(d, (list, tuple, set, frozenset)):
       d = dict(d)
-    if isinstance(d, (dict, OrderedDict)) and key in d:
+    if isinstance(d, dict) and key in d:
       if d[key] == value:
         return i
     i += 1
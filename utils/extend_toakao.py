@@ -2,8 +2,9 @@
 
 import sys, os, time
 
-from common import object_from_json_path, save_as_json_file
-from common import table_from_csv_url
+from common import entries_gen_from_json_path, save_as_json_file
+from common import content_from_url, table_from_csv_content
+from common import digests, MANIFEST_PATH
 
 SELF_PATH = os.path.dirname(os.path.realpath(__file__))
 
@@ -15,28 +16,43 @@ def entrypoint():
 	start_time = time.time()
 	def normalized(path):
 		return path.replace("/", os.path.sep)
-	toakao = object_from_json_path(
-		SELF_PATH + normalized("/../toakao.json"))
-	predilex = table_from_csv_url(PREDILEX_URL)
-	toakao = extended_from(toakao, predilex)
-	save_as_json_file(
-		toakao, SELF_PATH + normalized("/../toakao_extended.json"))
+	toakao_path = SELF_PATH + normalized("/../toakao.json")
+	output_path = SELF_PATH + normalized("/../toakao_extended.json")
+	predilex_content = content_from_url(PREDILEX_URL)
+	manifest = digests.manifest_from_path(MANIFEST_PATH)
+	inputs = {
+		"toakao.json": digests.sha256_of_file(toakao_path),
+		PREDILEX_URL: digests.sha256_of_bytes(predilex_content)
+	}
+	if digests.is_up_to_date(manifest, output_path, inputs):
+		print("toakao_extended.json is already up to date.")
+	else:
+		# The entries are read, extended and written one at a time.
+		toakao = entries_gen_from_json_path(toakao_path)
+		predilex = table_from_csv_content(predilex_content)
+		save_as_json_file(extended_from(toakao, predilex), output_path)
+		digests.record(
+			manifest, output_path, digests.sha256_of_file(output_path), inputs)
+		digests.save_manifest(manifest, MANIFEST_PATH)
 	print("Execution time: {:.3f}s.".format(
 		time.time() - start_time))
 
 def extended_from(toakao, predilex):
+	# Generator of the extended entries of ⟦toakao⟧.
 	header = predilex[0]
 	content = predilex[2:]
 	keys = ("tags", "eng_lem")
 	pid_i = header.index("id")
+	key_indices = [(k, header.index(k)) for k in keys]
+	# Should an ID appear on several rows, the last one prevails.
+	rows_by_id = {pe[pid_i]: pe for pe in content}
 	for te in toakao:
 		if te["sememe"] != "":
-			for pe in content:
-				if pe[pid_i] == te["sememe"]:
-					for k in keys:
-						pi = header.index(k)
-						te[k] = pe[pi]
-	return toakao
+			pe = rows_by_id.get(te["sememe"])
+			if pe is not None:
+				for k, pi in key_indices:
+					te[k] = pe[pi]
+		yield te
 
 # ============================================================ #
 
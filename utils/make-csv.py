@@ -2,7 +2,8 @@
 
 import sys, os, time, json
 
-from common import object_from_json_path, save_dicts_as_csv_file
+from common import dicts_gen_from_json_path, save_dict_gen_as_csv_file
+from common import digests, MANIFEST_PATH
 
 from fields import FIELD_ORDER
 
@@ -14,24 +15,32 @@ def entrypoint():
 	start_time = time.time()
 	def normalized(path):
 		return path.replace("/", os.path.sep)
-	data = object_from_json_path(
-		SELF_PATH + normalized("/../toakao.json"))
+	toakao_path = SELF_PATH + normalized("/../toakao.json")
+	output_path = SELF_PATH + normalized("/../toakao.csv")
+	manifest = digests.manifest_from_path(MANIFEST_PATH)
+	inputs = {"toakao.json": digests.sha256_of_file(toakao_path)}
+	if digests.is_up_to_date(manifest, output_path, inputs):
+		print("toakao.csv is already up to date.")
+		return
+	# Two passes over the file: one for the set of keys, one for the rows.
 	keys = sorted(
-		sorted(all_keys_of(data)),
+		sorted(all_keys_of(dicts_gen_from_json_path(toakao_path))),
 		key = lambda x: FIELD_ORDER.index(x)
 			if x in FIELD_ORDER else len(FIELD_ORDER)
 	)
-	data = [transformed(e, keys) for e in data]
-	save_dicts_as_csv_file(
-		data, SELF_PATH + normalized("/../toakao.csv"),
-		delimiter = ',')
+	data = (
+		transformed(e, keys) for e in dicts_gen_from_json_path(toakao_path))
+	save_dict_gen_as_csv_file(data, keys, output_path, delimiter = ',')
+	digests.record(
+		manifest, output_path, digests.sha256_of_file(output_path), inputs)
+	digests.save_manifest(manifest, MANIFEST_PATH)
 	print("Execution time: {:.3f}s.".format(
 		time.time() - start_time))
 
 def all_keys_of(maplist):
 	keys = set()
 	for e in maplist:
-		keys = keys.union(set(e.keys()))
+		keys.update(e.keys())
 	return keys
 
 def transformed(entry, keys):
@@ -0,0 +1,102 @@
+# ============================================================ #
+
+# Splits ⟦toakao_extended.json⟧ into shards, one per normalized initial of
+# the lemmas, written into ⟦shards/⟧ along with ⟦shards/manifest.json⟧, which
+# gives the entry count, byte size and SHA-256 digest of each shard.
+# Consumers such as the web browser can thus load only the shards they need,
+# and cache them by digest.
+
+import sys, os, time, unicodedata
+
+from common import dicts_gen_from_json_path, json_backend
+from common import digests, MANIFEST_PATH
+
+SELF_PATH = os.path.dirname(os.path.realpath(__file__))
+
+SHARD_MANIFEST_VERSION = 1
+
+# ============================================================ #
+
+def entrypoint():
+	start_time = time.time()
+	def normalized(path):
+		return path.replace("/", os.path.sep)
+	toakao_path = SELF_PATH + normalized("/../toakao_extended.json")
+	shards_dir = SELF_PATH + normalized("/../shards")
+	shard_manifest_path = os.path.join(shards_dir, "manifest.json")
+	manifest = digests.manifest_from_path(MANIFEST_PATH)
+	inputs = {"toakao_extended.json": digests.sha256_of_file(toakao_path)}
+	if digests.is_up_to_date(manifest, shard_manifest_path, inputs):
+		print("The shards are already up to date.")
+		return
+	shards = shards_from(dicts_gen_from_json_path(toakao_path))
+	shard_manifest = saved_shards(shards, shards_dir)
+	shard_manifest["source_sha256"] = inputs["toakao_extended.json"]
+	save_bytes(
+		json_backend.dumps(shard_manifest, indent = 2), shard_manifest_path)
+	digests.record(
+		manifest, shard_manifest_path,
+		digests.sha256_of_file(shard_manifest_path), inputs)
+	digests.save_manifest(manifest, MANIFEST_PATH)
+	print(f"{len(shards)} shards, {shard_manifest['count']} entries.")
+	print("Execution time: {:.3f}s.".format(
+		time.time() - start_time))
+
+def shard_key_of(lemma):
+	# The initial of the lemma, lowercase and without diacritics, ⟪i⟫ being
+	# identified with ⟪ı⟫; initials other than ASCII letters are spelled as
+	# their code point, so that keys are safe as file names and in URLs.
+	# ⟦browser/script.js⟧ computes the same keys.
+	s = unicodedata.normalize("NFD", lemma)
+	s = "".join(c for c in s if not unicodedata.combining(c)).lower()
+	if s == "":
+		return "_"
+	c = s[0].replace("i", "ı")
+	if "a" <= c <= "z":
+		return c
+	return "u%04x" % ord(c)
+
+def shards_from(entries):
+	# Entries keep their relative order within each shard.
+	shards = dict()
+	for e in entries:
+		shards.setdefault(shard_key_of(e["lemma"]), []).append(e)
+	return dict(sorted(shards.items()))
+
+def saved_shards(shards, shards_dir):
+	# Writes the shards (compact JSON), removes the stale ones, and returns
+	# the shard manifest.
+	os.makedirs(shards_dir, exist_ok = True)
+	shard_manifest = {
+		"version": SHARD_MANIFEST_VERSION,
+		"count": sum(len(entries) for entries in shards.values()),
+		"shards": dict()
+	}
+	for key, entries in shards.items():
+		content = json_backend.dumps(entries, indent = None)
+		filename = key + ".json"
+		save_bytes(content, os.path.join(shards_dir, filename))
+		shard_manifest["shards"][key] = {
+			"path": filename,
+			"count": len(entries),
+			"bytes": len(content),
+			"sha256": digests.sha256_of_bytes(content)
+		}
+	filenames = {shard["path"] for shard in shard_manifest["shards"].values()}
+	for filename in os.listdir(shards_dir):
+		if (
+			filename.endswith(".json") and filename != "manifest.json"
+			and filename not in filenames
+		):
+			os.remove(os.path.join(shards_dir, filename))
+	return shard_manifest
+
+def save_bytes(content, path):
+	with open(path, "wb") as f:
+		f.write(content)
+
+# ============================================================ #
+
+# === ENTRY POINT === #
+
+entrypoint()